@@ -0,0 +1,118 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from web3 import AsyncWeb3
+
+from multicallBatch import fetch_v2_reserves_async, fetch_v3_slot0_async
+from pipelineStats import add_stats_middleware
+from rpcClient import remove_validation_middleware
+
+# Default number of block requests allowed in flight at once
+DEFAULT_MAX_CONCURRENCY = 16
+
+#####################################################
+def get_async_w3(endpoint_uri):
+    return add_stats_middleware(remove_validation_middleware(AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(endpoint_uri))))
+
+#####################################################
+async def gather_ordered(fetch_block, block_numbers, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Run fetch_block(block_number) for many blocks concurrently, at most max_concurrency at a time.
+
+    A fixed pool of workers pulls block numbers from a shared iterator, so memory stays bounded
+    by the concurrency cap rather than by the length of the range.
+
+    Parameters:
+    - fetch_block (coroutine function): Called with one block number, returns that block's result.
+    - block_numbers (iterable): The block numbers to fetch.
+    - max_concurrency (int): The maximum number of requests in flight.
+
+    Returns:
+    - list: The results, in the same order as block_numbers.
+    """
+    block_numbers = list(block_numbers)
+    results = [None] * len(block_numbers)
+    pending = iter(enumerate(block_numbers))
+
+    async def worker():
+        for index, block_number in pending:
+            results[index] = await fetch_block(block_number)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(max_concurrency, len(block_numbers))))]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        raise
+
+    return results
+
+#####################################################
+async def fetch_range_async(endpoint_uri, fetch_function_async, addresses, start_block, end_block, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Fetch pool state for every block in [start_block, end_block] over a concurrent AsyncWeb3 connection.
+
+    Parameters:
+    - endpoint_uri (str): The JSON-RPC endpoint to query.
+    - fetch_function_async (coroutine function): fetch_v2_reserves_async or fetch_v3_slot0_async.
+    - addresses (list): The pool addresses read at every block (one Multicall3 call per block).
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - max_concurrency (int): The maximum number of blocks in flight.
+
+    Returns:
+    - dict: block_number -> list of decoded results for that block, in block order.
+    """
+    w3 = get_async_w3(endpoint_uri)
+    block_numbers = range(start_block, end_block + 1)
+    try:
+        results = await gather_ordered(lambda block_number: fetch_function_async(w3, addresses, block_number), block_numbers, max_concurrency)
+    finally:
+        if hasattr(w3.provider, 'disconnect'):
+            await w3.provider.disconnect()
+
+    return dict(zip(block_numbers, results))
+
+def fetch_range_threaded(w3, fetch_function, addresses, start_block, end_block, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Same as fetch_range_async, on worker threads sharing one synchronous connection.
+
+    Used when the client spreads requests over several endpoints: every request then goes through its
+    RpcScheduler, so the per-endpoint rate limits, latency weighting, hedging and failover all apply.
+
+    Parameters:
+    - w3 (Web3): The connection to use, e.g. the default client's.
+    - fetch_function (function): fetch_v2_reserves or fetch_v3_slot0.
+
+    Returns:
+    - dict: block_number -> list of decoded results for that block, in block order.
+    """
+    block_numbers = range(start_block, end_block + 1)
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(block_numbers)))) as executor:
+        # Submitted in chunks, so memory stays bounded by the concurrency cap rather than the range
+        for chunk_start in range(0, len(block_numbers), 64 * max_concurrency):
+            chunk = block_numbers[chunk_start:chunk_start + 64 * max_concurrency]
+            results.update(zip(chunk, executor.map(lambda block_number: fetch_function(w3, addresses, block_number), chunk)))
+
+    return results
+
+#####################################################
+def run_sync(coroutine):
+    """
+    Run a coroutine to completion from synchronous code, including inside a notebook that already
+    has an event loop running (in which case it is run on a helper thread).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def fetch_v2_reserves_range(endpoint_uri, pair_addresses, start_block, end_block, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    return run_sync(fetch_range_async(endpoint_uri, fetch_v2_reserves_async, pair_addresses, start_block, end_block, max_concurrency))
+
+def fetch_v3_slot0_range(endpoint_uri, pool_addresses, start_block, end_block, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    return run_sync(fetch_range_async(endpoint_uri, fetch_v3_slot0_async, pool_addresses, start_block, end_block, max_concurrency))
@@ -0,0 +1,111 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import rpcClient
+from priceRouter import price_routes, resolve_route
+from stateCache import StateCache
+
+# Blocks priced by one worker task
+DEFAULT_SHARD_BLOCKS = 10000
+
+#####################################################
+def _init_worker(endpoint_uri):
+    # The default client reconnects by itself in a new process; only a different endpoint needs configuring
+    if endpoint_uri:
+        rpcClient.configure(endpoint_uri)
+
+def _run_shard(shard):
+    shard_start, shard_end, routes, use_logs, cache_path = shard
+    cache = StateCache(cache_path) if cache_path else None
+    try:
+        return price_routes(routes, shard_start, shard_end, use_logs=use_logs, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+#####################################################
+def plan_shards(jobs, shard_blocks=DEFAULT_SHARD_BLOCKS):
+    """
+    Split a job list into block shards covering every job.
+
+    Shards are also cut wherever a job starts or ends, so every job in a shard covers all of it: no pool is
+    read outside the blocks its jobs need (or before it was deployed), and the pools shared by the jobs of a
+    shard are still read once per block.
+
+    Parameters:
+    - jobs (list): Dicts with keys label, route, start_block and end_block (see run_batch).
+    - shard_blocks (int): The maximum number of blocks per shard.
+
+    Returns:
+    - list: (shard_start, shard_end, routes) tuples in block order, where routes holds the route
+      of every job covering the shard.
+    """
+    if not jobs:
+        return []
+    first_block = min(job['start_block'] for job in jobs)
+    last_block = max(job['end_block'] for job in jobs)
+
+    shards = []
+    for window_start in range(first_block, last_block + 1, shard_blocks):
+        window_end = min(window_start + shard_blocks - 1, last_block)
+        boundaries = {window_start, window_end + 1}
+        for job in jobs:
+            boundaries.update(block for block in (job['start_block'], job['end_block'] + 1) if window_start < block <= window_end)
+
+        boundaries = sorted(boundaries)
+        for shard_start, next_start in zip(boundaries, boundaries[1:]):
+            shard_end = next_start - 1
+            routes = {job['label']: job['route'] for job in jobs if job['start_block'] <= shard_start and job['end_block'] >= shard_end}
+            if routes:
+                shards.append((shard_start, shard_end, routes))
+
+    return shards
+
+def run_batch(jobs, shard_blocks=DEFAULT_SHARD_BLOCKS, max_workers=None, endpoint_uri=None, use_logs=False, cache_path=None):
+    """
+    Price many tokens over their block ranges, sharded by block range across a process pool.
+
+    Within a shard every pool is read once per block, so stable pools shared by many jobs
+    (e.g. USDC/ETH) are fetched once per shard rather than once per job.
+
+    Parameters:
+    - jobs (list): Dicts with keys
+        - label (str): The name of the job, used as the output key and column prefix.
+        - route (list): (version, pool_address) hops to a USD stablecoin, see priceRouter.price_routes.
+        - start_block (int): The first block number.
+        - end_block (int): The last block number (inclusive).
+    - shard_blocks (int): The maximum number of blocks per worker task.
+    - max_workers (int): The number of worker processes (CPU count by default).
+    - endpoint_uri (str or list): The JSON-RPC endpoint(s) used by the workers (Infura by default), see rpcClient.configure.
+    - use_logs (bool): Rebuild pool state from events instead of reading every block.
+    - cache_path (str): If set, every worker reads and writes this on-disk StateCache.
+
+    Returns:
+    - dict: label -> DataFrame with a '<label>_price_in_usd' column indexed by block_number.
+    """
+    labels = [job['label'] for job in jobs]
+    if len(set(labels)) != len(labels):
+        raise ValueError("Job labels must be unique.")
+
+    # Resolve every route up front so token metadata is fetched and persisted once, not by every worker
+    for job in jobs:
+        resolve_route(job['route'])
+
+    shards = plan_shards(jobs, shard_blocks)
+    tasks = [(shard_start, shard_end, routes, use_logs, cache_path) for shard_start, shard_end, routes in shards]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(endpoint_uri,)) as executor:
+        shard_frames = list(executor.map(_run_shard, tasks))
+
+    # Merge the per-shard outputs of every job in block order
+    results = {}
+    for job in jobs:
+        column = f"{job['label']}_price_in_usd"
+        pieces = [
+            df.loc[job['start_block']:job['end_block'], [column]]
+            for df in shard_frames
+            if column in df.columns
+        ]
+        results[job['label']] = pd.concat(pieces) if pieces else pd.DataFrame(columns=[column])
+
+    return results
@@ -0,0 +1,143 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import rpcClient
+import tokenPriceUniV2 as uni_v2
+import tokenPriceUniV3 as uni_v3
+from mockNode import MockChain, MockNodeProcess, DEFAULT_CHANGE_EVERY
+from stateCache import StateCache
+from tokenRegistry import PoolRegistry
+
+DEFAULT_BLOCKS = 500
+DEFAULT_MAX_CONCURRENCY = 16
+
+# Fetch strategy -> keyword arguments of the create_price_dataframe_* functions; 'cache' is replaced by a StateCache
+STRATEGIES = {
+    'per_block': {},
+    'async': {'max_concurrency': DEFAULT_MAX_CONCURRENCY},
+    'logs': {'use_logs': True},
+    'cache_cold': {'cache': True},
+    'cache_warm': {'cache': True},
+    'adaptive': {'adaptive': True},
+    'storage': {'use_storage': True},
+}
+# Strategies that only exist for some pipelines
+STRATEGY_VERSIONS = {
+    'adaptive': ('v2',),
+}
+
+PIPELINES = {
+    'v2': (uni_v2, uni_v2.create_price_dataframe_v2),
+    'v3': (uni_v3, uni_v3.create_price_dataframe_v3),
+}
+
+#####################################################
+def run_strategy(node, version, strategy, start_block, end_block, cache_path):
+    """
+    Price a block range on a mock node with one fetch strategy and measure its cost.
+
+    Token metadata is resolved before the measurement, so only the per-block work is counted.
+
+    Returns:
+    - dict: blocks_per_sec, calls_per_block, requests_per_block, bytes_in, bytes_out, peak_memory_mb,
+      rate_limited and checksum (the sum of the prices, equal for every strategy when they agree).
+    """
+    module, create_price_dataframe = PIPELINES[version]
+    pool_addresses = node.chain.pool_addresses(version)[:3]
+    module.registry = PoolRegistry(path=None)
+    module.registry.get_pools(pool_addresses)
+
+    kwargs = dict(STRATEGIES[strategy])
+    cache = None
+    if kwargs.get('cache'):
+        if strategy == 'cache_cold' and os.path.exists(cache_path):
+            os.remove(cache_path)
+        cache = kwargs['cache'] = StateCache(cache_path)
+
+    node.reset_stats()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        df = create_price_dataframe(start_block, end_block, *pool_addresses, file_name=None, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if cache is not None:
+            cache.close()
+
+    stats = node.stats()
+    block_count = end_block - start_block + 1
+    return {
+        'blocks_per_sec': block_count / elapsed,
+        'calls_per_block': stats['rpc_calls'] / block_count,
+        'requests_per_block': stats['http_requests'] / block_count,
+        'bytes_in': stats['bytes_in'],
+        'bytes_out': stats['bytes_out'],
+        'peak_memory_mb': peak_memory / 2 ** 20,
+        'rate_limited': stats['rate_limited'],
+        'checksum': float(df.sum().sum()),
+    }
+
+def run_benchmarks(versions=tuple(PIPELINES), strategies=tuple(STRATEGIES), blocks=DEFAULT_BLOCKS, latency=0.0, rate_limit=None, seed=0,
+                   change_every=DEFAULT_CHANGE_EVERY):
+    """
+    Run every (version, strategy) pair against one deterministic mock node, served from a separate process.
+
+    Parameters:
+    - versions (list): Pipelines to run, 'v2' and/or 'v3'.
+    - strategies (list): Names from STRATEGIES.
+    - blocks (int): The number of blocks priced per run.
+    - latency (float): Seconds added by the mock node to every HTTP request.
+    - rate_limit (float): If set, the mock node's requests per second limit.
+    - seed (int): The seed of the synthetic chain.
+    - change_every (int): Blocks between two state changes of a synthetic pool (higher = sparser pools).
+
+    Returns:
+    - list: One dict per run with keys version, strategy and the metrics of run_strategy.
+    """
+    chain = MockChain(seed=seed, change_every=change_every)
+    end_block = chain.head_block
+    start_block = end_block - blocks + 1
+    results = []
+
+    # The node runs in its own process, so blocks_per_sec and peak_memory_mb only measure the pipeline
+    with MockNodeProcess(chain, latency=latency, rate_limit=rate_limit) as node, tempfile.TemporaryDirectory() as directory:
+        rpcClient.configure(node.url)
+        for version in versions:
+            cache_path = os.path.join(directory, f'{version}.sqlite')
+            for strategy in strategies:
+                if version not in STRATEGY_VERSIONS.get(strategy, PIPELINES):
+                    continue
+                metrics = run_strategy(node, version, strategy, start_block, end_block, cache_path)
+                results.append({'version': version, 'strategy': strategy, **metrics})
+
+    return results
+
+def format_results(results):
+    columns = ['version', 'strategy', 'blocks_per_sec', 'calls_per_block', 'requests_per_block',
+               'bytes_in', 'bytes_out', 'peak_memory_mb', 'rate_limited', 'checksum']
+    lines = [' '.join(f'{column:>18}' for column in columns)]
+    for result in results:
+        lines.append(' '.join(
+            f'{result[column]:>18.3f}' if isinstance(result[column], float) else f'{result[column]:>18}'
+            for column in columns))
+    return '\n'.join(lines)
+
+#####################################################
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the price pipelines against a local mock node.")
+    parser.add_argument('--versions', nargs='+', default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument('--blocks', type=int, default=DEFAULT_BLOCKS)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--rate-limit', type=float, default=None, help="requests per second")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--change-every', type=int, default=DEFAULT_CHANGE_EVERY, help="blocks between pool state changes")
+    args = parser.parse_args()
+
+    print(format_results(run_benchmarks(args.versions, args.strategies, args.blocks, args.latency, args.rate_limit, args.seed,
+                                        args.change_every)))
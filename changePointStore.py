@@ -0,0 +1,224 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from tokenPriceUniV2 import reserves_to_price
+from tokenPriceUniV3 import tick_to_price
+
+# Raw state columns kept per kind, with the position of each in a fetched state tuple; reserves and
+# sqrtPriceX96 are held as float64, the precision the price computations use anyway
+SERIES_COLUMNS = {
+    'v2_reserves': {'reserve0': (0, np.float64), 'reserve1': (1, np.float64)},
+    'v3_slot0': {'sqrt_price_x96': (0, np.float64), 'tick': (1, np.int64)},
+}
+INITIAL_CAPACITY = 64
+
+#####################################################
+class ChangePointSeries:
+    """
+    Run-length compressed state history of one pool: only the blocks where the state changes are stored,
+    in growable NumPy columns, together with the block range the history covers.
+
+    The state at any block is found by bisecting the change-point blocks, and a dense per-block
+    view is only built when expand() or to_dataframe() is called.
+
+    Parameters:
+    - kind (str): 'v2_reserves' or 'v3_slot0'.
+    """
+
+    def __init__(self, kind):
+        if kind not in SERIES_COLUMNS:
+            raise ValueError("Invalid kind. Must be 'v2_reserves' or 'v3_slot0'.")
+        self.kind = kind
+        self.size = 0
+        self.start_block = None
+        self.end_block = None
+        self.blocks = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self.columns = {column: np.empty(INITIAL_CAPACITY, dtype=dtype) for column, (_, dtype) in SERIES_COLUMNS[kind].items()}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self.blocks[:self.size].nbytes + sum(values[:self.size].nbytes for values in self.columns.values())
+
+    def _grow(self):
+        capacity = 2 * len(self.blocks)
+        self.blocks = np.resize(self.blocks, capacity)
+        self.columns = {column: np.resize(values, capacity) for column, values in self.columns.items()}
+
+    def append(self, block_number, state):
+        """
+        Record the state of the pool at block_number, which must be the block right after the ones already covered.
+        The state is only stored if it differs from the previous one.
+        """
+        if self.end_block is not None and block_number != self.end_block + 1:
+            raise ValueError(f"Block {block_number} does not follow the covered range (up to {self.end_block}).")
+        self.append_sample(block_number, state)
+
+    def append_sample(self, block_number, state):
+        """
+        Same as append, but blocks skipped since the previous call are taken to hold the previous state.
+        Only for samples known to bracket every change, such as those of find_reserve_changes.
+        """
+        if self.end_block is not None and block_number <= self.end_block:
+            raise ValueError(f"Block {block_number} is already covered (up to {self.end_block}).")
+        if self.start_block is None:
+            self.start_block = block_number
+        self.end_block = block_number
+
+        values = {column: state[position] for column, (position, _) in SERIES_COLUMNS[self.kind].items()}
+        if self.size and all(self.columns[column][self.size - 1] == value for column, value in values.items()):
+            return
+        if self.size == len(self.blocks):
+            self._grow()
+        self.blocks[self.size] = block_number
+        for column, value in values.items():
+            self.columns[column][self.size] = value
+        self.size += 1
+
+    def extend(self, states_by_block):
+        """
+        Record the states of a fetch, as block_number -> state, e.g. one pool's column of fetch_reserves_range.
+        """
+        for block_number in sorted(states_by_block):
+            self.append(block_number, states_by_block[block_number])
+
+    def extend_samples(self, samples, end_block):
+        """
+        Record the sparse output of find_reserve_changes (one pool's column of it): each sampled state holds
+        until the next sample, and the last one until end_block. Samples already covered are skipped, but the
+        first sample must not start after the covered range, or the blocks in between would be made up.
+        """
+        block_numbers = sorted(samples)
+        if self.end_block is not None and block_numbers and block_numbers[0] > self.end_block + 1:
+            raise ValueError(f"Samples start at block {block_numbers[0]}, after a gap from the covered range (up to {self.end_block}).")
+        for block_number in block_numbers:
+            if self.end_block is None or block_number > self.end_block:
+                self.append_sample(block_number, samples[block_number])
+        if self.end_block is not None:
+            self.end_block = max(self.end_block, end_block)
+
+    #####################################################
+    def _positions(self, block_numbers):
+        block_numbers = np.asarray(block_numbers, dtype=np.int64)
+        if self.size == 0 or block_numbers.min() < self.start_block or block_numbers.max() > self.end_block:
+            raise KeyError(f"Blocks outside the covered range {self.start_block}-{self.end_block}.")
+        return np.searchsorted(self.blocks[:self.size], block_numbers, side='right') - 1
+
+    def at(self, block_number):
+        """
+        Return the state at one block as a dict of raw columns.
+        """
+        position = self._positions([block_number])[0]
+        return {column: values[position].item() for column, values in self.columns.items()}
+
+    def expand(self, start_block=None, end_block=None):
+        """
+        Expand the history into dense per-block arrays.
+
+        Returns:
+        - dict: column -> array with one value per block of [start_block, end_block] (the covered range by default).
+        """
+        start_block = self.start_block if start_block is None else start_block
+        end_block = self.end_block if end_block is None else end_block
+        positions = self._positions(np.arange(start_block, end_block + 1))
+        return {column: values[:self.size][positions] for column, values in self.columns.items()}
+
+    def prices(self, start_block, end_block, token0_decimals, token1_decimals, token_to_price):
+        """
+        Dense per-block prices of one token of the pool, computed once per change point and then expanded.
+        """
+        positions = self._positions(np.arange(start_block, end_block + 1))
+        if self.kind == 'v2_reserves':
+            change_point_prices = reserves_to_price((self.columns['reserve0'][:self.size], self.columns['reserve1'][:self.size]),
+                                                    token0_decimals, token1_decimals, token_to_price)
+        else:
+            change_point_prices = tick_to_price(self.columns['tick'][:self.size], token0_decimals, token1_decimals, token_to_price)
+        return change_point_prices[positions]
+
+    def price_at(self, block_number, token0_decimals, token1_decimals, token_to_price):
+        return float(self.prices(block_number, block_number, token0_decimals, token1_decimals, token_to_price)[0])
+
+    def to_dataframe(self, start_block=None, end_block=None, dense=False):
+        """
+        Return the change points (or, with dense=True, every block) as a DataFrame indexed by block_number.
+        """
+        if dense:
+            start_block = self.start_block if start_block is None else start_block
+            end_block = self.end_block if end_block is None else end_block
+            index = pd.RangeIndex(start_block, end_block + 1, name='block_number')
+            return pd.DataFrame(self.expand(start_block, end_block), index=index)
+        df = pd.DataFrame({column: values[:self.size] for column, values in self.columns.items()},
+                          index=pd.Index(self.blocks[:self.size], name='block_number'))
+        return df.loc[start_block:end_block]
+
+    #####################################################
+    def save(self, path):
+        np.savez_compressed(path, kind=self.kind, covered=np.array([-1 if self.size == 0 else self.start_block, -1 if self.size == 0 else self.end_block], dtype=np.int64),
+                            blocks=self.blocks[:self.size], **{column: values[:self.size] for column, values in self.columns.items()})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            series = cls(str(data['kind']))
+            series.blocks = data['blocks'].copy()
+            series.columns = {column: data[column].copy() for column in series.columns}
+            series.size = len(series.blocks)
+            series.start_block, series.end_block = (int(block) for block in data['covered'])
+        if series.size == 0:
+            series.blocks = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+            series.columns = {column: np.empty(INITIAL_CAPACITY, dtype=dtype) for column, (_, dtype) in SERIES_COLUMNS[series.kind].items()}
+            series.start_block = series.end_block = None
+        return series
+
+#####################################################
+class ChangePointStore:
+    """
+    Directory of ChangePointSeries, one compressed .npz file per (kind, pool).
+
+    Parameters:
+    - root (str): The directory holding the series files.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.series = {}
+
+    def path(self, kind, pool_address):
+        return os.path.join(self.root, f'{kind}-{pool_address.lower()}.npz')
+
+    def get(self, kind, pool_address):
+        key = (kind, pool_address.lower())
+        if key not in self.series:
+            path = self.path(kind, pool_address)
+            self.series[key] = ChangePointSeries.load(path) if os.path.exists(path) else ChangePointSeries(kind)
+        return self.series[key]
+
+    def record(self, kind, pool_addresses, states_by_block):
+        """
+        Add the output of fetch_reserves_range / fetch_slot0_range (block -> one state per pool) to the store.
+        Blocks already covered by a pool's series are skipped; the rest must continue it without a gap.
+        """
+        for position, pool_address in enumerate(pool_addresses):
+            series = self.get(kind, pool_address)
+            for block_number in sorted(states_by_block):
+                if series.end_block is None or block_number > series.end_block:
+                    series.append(block_number, states_by_block[block_number][position])
+
+    def record_samples(self, kind, pool_addresses, samples, end_block):
+        """
+        Add the output of find_reserve_changes (sampled block -> one state per pool, valid up to end_block) to the store.
+        """
+        for position, pool_address in enumerate(pool_addresses):
+            series = self.get(kind, pool_address)
+            series.extend_samples({block_number: states[position] for block_number, states in samples.items()}, end_block)
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        for (kind, pool_address), series in self.series.items():
+            temporary_path = self.path(kind, pool_address) + '.tmp.npz'
+            series.save(temporary_path)
+            os.replace(temporary_path, self.path(kind, pool_address))
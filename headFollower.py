@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from rpcClient import get_w3
+
+DEFAULT_POLL_INTERVAL = 12  # seconds, one mainnet slot
+# Deepest reorg that can be rolled back; block hashes are remembered this far behind the head
+DEFAULT_MAX_REORG_DEPTH = 64
+# Blocks priced per update while catching up with the head
+DEFAULT_MAX_BLOCKS_PER_UPDATE = 1000
+# Seconds between two sink flushes, so a crash while following loses at most this much output
+DEFAULT_FLUSH_INTERVAL = 60
+
+#####################################################
+def find_common_ancestor(w3, block_hashes):
+    """
+    Return the highest remembered block that is still on the canonical chain, or None if none is.
+    """
+    for block_number in sorted(block_hashes, reverse=True):
+        if w3.eth.get_block(block_number)['hash'] == block_hashes[block_number]:
+            return block_number
+    return None
+
+def follow_head(create_price_dataframe, *args, start_block=None, end_block=None, sink=None, w3=None,
+                poll_interval=DEFAULT_POLL_INTERVAL, confirmations=0, max_reorg_depth=DEFAULT_MAX_REORG_DEPTH,
+                max_blocks_per_update=DEFAULT_MAX_BLOCKS_PER_UPDATE, flush_interval=DEFAULT_FLUSH_INTERVAL, **kwargs):
+    """
+    Follow the chain head, pricing only the new blocks as they arrive.
+
+    eth_blockNumber is polled every poll_interval seconds. The headers of new blocks are checked
+    against the remembered hash of their parent; when they do not match, the blocks after the last
+    common ancestor are rolled back (in the sink and the state cache too) and priced again, instead of
+    recomputing history.
+
+    Parameters:
+    - create_price_dataframe (function): Called as create_price_dataframe(start_block, end_block, *args, file_name=None, **kwargs):
+      one of the create_price_dataframe_* functions, or functools.partial(priceRouter.price_routes, routes).
+    - *args, **kwargs: The remaining arguments of create_price_dataframe (pair addresses, cache, ...).
+    - start_block (int): The first block to price. Defaults to the block after the sink's last stored block,
+      or to the current head.
+    - end_block (int): If set, stop after this block; otherwise follow forever.
+    - sink (ParquetPriceSink): If set, every update is written to it and rollbacks are applied to it.
+    - w3 (Web3): The connection to poll, the default client's by default.
+    - poll_interval (float): Seconds to wait when there is no new block.
+    - confirmations (int): Only price blocks at least this many blocks behind the head.
+    - max_reorg_depth (int): The deepest reorg that can be rolled back.
+    - max_blocks_per_update (int): Blocks priced at once while catching up.
+    - flush_interval (float): Seconds between two flushes of the sink's buffered rows to disk.
+
+    Yields:
+    - tuple: (rollback_block, df) where df holds the prices of the newly priced blocks, and rollback_block is
+      None or the first block whose previously yielded prices were invalidated by a reorg.
+    """
+    w3 = w3 or get_w3()
+    if start_block is None and sink is not None and sink.last_block() is not None:
+        start_block = sink.last_block() + 1
+    if start_block is None:
+        start_block = w3.eth.block_number - confirmations
+
+    next_block = start_block
+    block_hashes = {}
+    rollback_block = None
+    # The cache may also be bound in a functools.partial, e.g. partial(price_routes, routes, cache=cache)
+    cache = kwargs.get('cache', getattr(create_price_dataframe, 'keywords', {}).get('cache'))
+    last_flush = time.monotonic()
+
+    try:
+        while end_block is None or next_block <= end_block:
+            head = w3.eth.block_number - confirmations
+            if end_block is not None:
+                head = min(head, end_block)
+            if head < next_block:
+                time.sleep(poll_interval)
+                continue
+            last = min(head, next_block + max_blocks_per_update - 1)
+
+            # Headers are read before pricing, so a reorg racing with the pricing is caught on the next poll
+            headers = {}
+            for block_number in range(max(next_block, last - max_reorg_depth + 1), last + 1):
+                headers[block_number] = w3.eth.get_block(block_number)
+            reorged = any(
+                header['parentHash'] != (headers[block_number - 1]['hash'] if block_number - 1 in headers else block_hashes[block_number - 1])
+                for block_number, header in headers.items()
+                if block_number - 1 in headers or block_number - 1 in block_hashes
+            )
+
+            if reorged:
+                ancestor = find_common_ancestor(w3, block_hashes)
+                if ancestor is None:
+                    raise RuntimeError(f"Reorg deeper than {max_reorg_depth} blocks below block {next_block}.")
+                block_hashes = {block_number: block_hash for block_number, block_hash in block_hashes.items() if block_number <= ancestor}
+                if sink is not None:
+                    sink.rollback(ancestor)
+                # Otherwise the blocks after the ancestor would be priced again from the orphaned states
+                if cache is not None:
+                    cache.delete_after(ancestor)
+                next_block = ancestor + 1
+                rollback_block = next_block if rollback_block is None else min(rollback_block, next_block)
+                continue
+
+            df = create_price_dataframe(next_block, last, *args, file_name=None, **kwargs)
+            if sink is not None:
+                sink.write(df)
+                if time.monotonic() - last_flush >= flush_interval:
+                    sink.flush()
+                    last_flush = time.monotonic()
+
+            block_hashes.update((block_number, header['hash']) for block_number, header in headers.items())
+            for block_number in [block_number for block_number in block_hashes if block_number <= last - max_reorg_depth]:
+                del block_hashes[block_number]
+
+            yield rollback_block, df
+            rollback_block = None
+            next_block = last + 1
+    finally:
+        if sink is not None:
+            sink.flush()
+
+async def follow_head_async(create_price_dataframe, *args, **kwargs):
+    """
+    Async iterator version of follow_head; each poll and pricing step runs on a helper thread.
+    """
+    updates = follow_head(create_price_dataframe, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            update = await loop.run_in_executor(None, next, updates, done)
+            if update is done:
+                return
+            yield update
+    finally:
+        updates.close()
@@ -0,0 +1,75 @@
+# Number of blocks requested per eth_getLogs call; halved automatically when a provider rejects the query
+DEFAULT_LOG_CHUNK_SIZE = 5000
+
+#####################################################
+def get_logs_chunked(w3, addresses, topic0, from_block, to_block, chunk_size=DEFAULT_LOG_CHUNK_SIZE):
+    """
+    Fetch the logs of one event type emitted by a set of contracts over a block range.
+
+    The range is split into chunks of chunk_size blocks. If a provider rejects a chunk (e.g. too many
+    results), the chunk is retried at half the size until it succeeds or is down to a single block.
+
+    Parameters:
+    - w3 (Web3): The Web3 instance to use.
+    - addresses (list): The contract addresses emitting the event.
+    - topic0 (str): The event signature hash.
+    - from_block (int): The first block number.
+    - to_block (int): The last block number (inclusive).
+    - chunk_size (int): The number of blocks per eth_getLogs call.
+
+    Returns:
+    - generator: The logs, in (blockNumber, logIndex) order.
+    """
+    chunk_start = from_block
+    while chunk_start <= to_block:
+        chunk_end = min(chunk_start + chunk_size - 1, to_block)
+        try:
+            logs = w3.eth.get_logs({
+                'address': list(addresses),
+                'topics': [topic0],
+                'fromBlock': chunk_start,
+                'toBlock': chunk_end,
+            })
+        except Exception:
+            if chunk_end == chunk_start:
+                raise
+            chunk_size = max(1, (chunk_end - chunk_start + 1) // 2)
+            continue
+
+        for log in sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])):
+            if not log.get('removed', False):
+                yield log
+        chunk_start = chunk_end + 1
+
+#####################################################
+def forward_fill(addresses, initial_states, events, start_block, end_block):
+    """
+    Rebuild the per-block state of several contracts from their state at start_block and the events after it.
+
+    Parameters:
+    - addresses (list): The contract addresses, in the order of initial_states.
+    - initial_states (list): The state of each contract at the end of start_block.
+    - events (iterable): (block_number, log_index, address, new_state) tuples for blocks after start_block.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+
+    Returns:
+    - dict: block_number -> list of states, one per address, as of the end of that block.
+    """
+    positions = {}
+    for position, address in enumerate(addresses):
+        positions.setdefault(address.lower(), []).append(position)
+
+    events_by_block = {}
+    for block_number, log_index, address, new_state in sorted(events, key=lambda event: (event[0], event[1])):
+        events_by_block.setdefault(block_number, []).append((address, new_state))
+
+    current = list(initial_states)
+    states_by_block = {}
+    for block_number in range(start_block, end_block + 1):
+        for address, new_state in events_by_block.get(block_number, ()):
+            for position in positions.get(address.lower(), ()):
+                current[position] = new_state
+        states_by_block[block_number] = list(current)
+
+    return states_by_block
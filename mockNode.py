@@ -0,0 +1,433 @@
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from eth_abi import encode, decode
+from eth_utils import keccak, to_checksum_address
+
+from multicallBatch import (MULTICALL3_ADDRESS, GET_RESERVES_SELECTOR, SLOT0_SELECTOR, DECIMALS_SELECTOR,
+                            TOKEN0_SELECTOR, TOKEN1_SELECTOR, OBSERVE_SELECTOR, OBSERVATIONS_SELECTOR)
+from rpcScheduler import TokenBucket
+from storageReader import V2_RESERVES_SLOT, V3_SLOT0_SLOT
+from tokenPriceUniV2 import SYNC_TOPIC
+from tokenPriceUniV3 import SWAP_TOPIC
+
+AGGREGATE3_SELECTOR = keccak(text='aggregate3((address,bool,bytes)[])')[:4]
+
+# Synthetic chain defaults: a head well after the Multicall3 deployment, one block every 12 seconds
+DEFAULT_HEAD_BLOCK = 18000000
+DEFAULT_CHANGE_EVERY = 5  # average number of blocks between two state changes of a pool
+DEFAULT_ORACLE_BLOCKS = 7200  # how far back (in blocks) the V3 oracle ring buffers reach, about a day
+ORACLE_CARDINALITY = 1000
+GENESIS_TIMESTAMP = 1438269973
+BLOCK_TIME = 12
+
+#####################################################
+def synthetic_address(*parts):
+    return to_checksum_address(keccak(text=':'.join(str(part) for part in parts))[:20])
+
+#####################################################
+class MockChain:
+    """
+    Deterministic synthetic chain state of Uniswap V2 pairs, V3 pools and their tokens.
+
+    Every pool changes state once per epoch of change_every blocks (each pool with its own offset),
+    and emits a Sync (V2) or Swap (V3) event at the first block of every epoch, so reading every block
+    and rebuilding the state from logs give identical results. The same seed always gives the same chain.
+
+    Parameters:
+    - v2_pairs (int): The number of Uniswap V2 pairs.
+    - v3_pools (int): The number of Uniswap V3 pools.
+    - seed (int): The seed of every synthetic value.
+    - head_block (int): The block number returned by eth_blockNumber.
+    - change_every (int): The number of blocks between two state changes of a pool.
+    - oracle_blocks (int): How many blocks back the observe() oracle of the V3 pools reaches.
+    """
+
+    def __init__(self, v2_pairs=3, v3_pools=3, seed=0, head_block=DEFAULT_HEAD_BLOCK, change_every=DEFAULT_CHANGE_EVERY,
+                 oracle_blocks=DEFAULT_ORACLE_BLOCKS):
+        self.seed = seed
+        self.head_block = head_block
+        self.change_every = change_every
+        self.oracle_blocks = oracle_blocks
+        self.tick_prefix_sums = {}
+
+        token_count = max(2, v2_pairs + v3_pools + 1)
+        self.tokens = {synthetic_address(seed, 'token', i).lower(): random.Random(f'{seed}:decimals:{i}').choice([6, 8, 18])
+                       for i in range(token_count)}
+        token_addresses = list(self.tokens)
+
+        self.pools = {}
+        for version, count in (('v2', v2_pairs), ('v3', v3_pools)):
+            for i in range(count):
+                pool = synthetic_address(seed, version, i).lower()
+                # Chain the pools token i / token i+1, so routes between them exist
+                self.pools[pool] = {'version': version, 'token0': token_addresses[len(self.pools)], 'token1': token_addresses[len(self.pools) + 1],
+                                    'offset': random.Random(f'{seed}:offset:{pool}').randrange(change_every)}
+
+    def pool_addresses(self, version):
+        return [to_checksum_address(pool) for pool, info in self.pools.items() if info['version'] == version]
+
+    def epoch(self, pool, block_number):
+        return (block_number + self.pools[pool]['offset']) // self.change_every
+
+    def epoch_start(self, pool, epoch):
+        return epoch * self.change_every - self.pools[pool]['offset']
+
+    def reserves(self, pool, block_number):
+        info = self.pools[pool]
+        rng = random.Random(f'{self.seed}:{pool}:{self.epoch(pool, block_number)}')
+        reserve0 = int(rng.uniform(1e4, 1e6) * 10 ** self.tokens[info['token0']])
+        reserve1 = int(rng.uniform(1e4, 1e6) * 10 ** self.tokens[info['token1']])
+        return reserve0, reserve1, self.block_timestamp(self.epoch_start(pool, self.epoch(pool, block_number))) % 2 ** 32
+
+    def slot0(self, pool, block_number):
+        rng = random.Random(f'{self.seed}:{pool}:{self.epoch(pool, block_number)}')
+        tick = rng.randrange(-200000, 200000)
+        sqrt_price_x96 = int(math.sqrt(1.0001 ** tick) * 2 ** 96)
+        # The oracle ring buffer is full, so its oldest observation is index 0, right after the current one
+        return sqrt_price_x96, tick, ORACLE_CARDINALITY - 1, ORACLE_CARDINALITY, ORACLE_CARDINALITY, 0, True
+
+    def tick_cumulative(self, pool, timestamp):
+        """
+        Sum of the pool's tick over every second up to timestamp, counted from a fixed origin well
+        before the oracle window, as returned by observe().
+        """
+        origin_block = self.head_block - 2 * self.oracle_blocks
+        first_epoch = self.epoch(pool, origin_block)
+        if pool not in self.tick_prefix_sums:
+            # Cumulative tick at the start of every epoch from the origin to the head
+            sums, total = [], 0
+            for epoch in range(first_epoch, self.epoch(pool, self.head_block) + 2):
+                sums.append(total)
+                duration = (self.epoch_start(pool, epoch + 1) - max(self.epoch_start(pool, epoch), origin_block)) * BLOCK_TIME
+                total += self.slot0(pool, max(self.epoch_start(pool, epoch), origin_block))[1] * duration
+            self.tick_prefix_sums[pool] = sums
+
+        block_number = (timestamp - GENESIS_TIMESTAMP) // BLOCK_TIME
+        epoch = self.epoch(pool, block_number)
+        epoch_start_time = self.block_timestamp(max(self.epoch_start(pool, epoch), origin_block))
+        return self.tick_prefix_sums[pool][epoch - first_epoch] + self.slot0(pool, block_number)[1] * (timestamp - epoch_start_time)
+
+    def oldest_observation_timestamp(self, block_number):
+        return self.block_timestamp(block_number - self.oracle_blocks)
+
+    def block_timestamp(self, block_number):
+        return GENESIS_TIMESTAMP + block_number * BLOCK_TIME
+
+    def block_hash(self, block_number):
+        return keccak(text=f'{self.seed}:block:{block_number}')
+
+    def storage_at(self, address, slot, block_number):
+        """
+        Return a storage word as an integer; only the packed reserve / slot0 slots of the pools are modelled.
+        """
+        address = address.lower()
+        info = self.pools.get(address)
+        if info is not None and info['version'] == 'v2' and slot == V2_RESERVES_SLOT:
+            reserve0, reserve1, block_timestamp_last = self.reserves(address, block_number)
+            return reserve0 | reserve1 << 112 | block_timestamp_last << 224
+        if info is not None and info['version'] == 'v3' and slot == V3_SLOT0_SLOT:
+            sqrt_price_x96, tick, observation_index, cardinality, cardinality_next, fee_protocol, unlocked = self.slot0(address, block_number)
+            return (sqrt_price_x96 | (tick % (1 << 24)) << 160 | observation_index << 184 | cardinality << 200
+                    | cardinality_next << 216 | fee_protocol << 232 | int(unlocked) << 240)
+        return 0
+
+    #####################################################
+    def call(self, to, data, block_number):
+        """
+        Execute a read call, returning the ABI-encoded return data.
+        """
+        to = to.lower()
+        selector = data[:4]
+        if to == MULTICALL3_ADDRESS.lower() and selector == AGGREGATE3_SELECTOR:
+            (calls,) = decode(['(address,bool,bytes)[]'], data[4:])
+            results = []
+            for target, allow_failure, call_data in calls:
+                try:
+                    results.append((True, self.call(target, call_data, block_number)))
+                except ValueError:
+                    if not allow_failure:
+                        raise
+                    results.append((False, b''))
+            return encode(['(bool,bytes)[]'], [results])
+        if to in self.tokens and selector == DECIMALS_SELECTOR:
+            return encode(['uint8'], [self.tokens[to]])
+        if to in self.pools:
+            info = self.pools[to]
+            if selector == TOKEN0_SELECTOR:
+                return encode(['address'], [info['token0']])
+            if selector == TOKEN1_SELECTOR:
+                return encode(['address'], [info['token1']])
+            if selector == GET_RESERVES_SELECTOR and info['version'] == 'v2':
+                return encode(['uint112', 'uint112', 'uint32'], self.reserves(to, block_number))
+            if selector == SLOT0_SELECTOR and info['version'] == 'v3':
+                return encode(['uint160', 'int24', 'uint16', 'uint16', 'uint16', 'uint8', 'bool'], self.slot0(to, block_number))
+            if selector == OBSERVE_SELECTOR and info['version'] == 'v3':
+                (seconds_agos,) = decode(['uint32[]'], data[4:])
+                timestamps = [self.block_timestamp(block_number) - seconds_ago for seconds_ago in seconds_agos]
+                if min(timestamps, default=0) < self.oldest_observation_timestamp(block_number):
+                    raise ValueError("execution reverted: OLD")
+                return encode(['int56[]', 'uint160[]'], [[self.tick_cumulative(to, timestamp) for timestamp in timestamps], [0] * len(timestamps)])
+            if selector == OBSERVATIONS_SELECTOR and info['version'] == 'v3':
+                (index,) = decode(['uint256'], data[4:])
+                timestamp = self.oldest_observation_timestamp(block_number) if index == 0 else self.block_timestamp(block_number)
+                return encode(['uint32', 'int56', 'uint160', 'bool'], [timestamp, self.tick_cumulative(to, timestamp), 0, True])
+        raise ValueError(f"execution reverted: no method {selector.hex()} on {to}")
+
+    def get_logs(self, addresses, topic0, from_block, to_block):
+        logs = []
+        for pool in addresses:
+            info = self.pools.get(pool.lower())
+            if info is None:
+                continue
+            if info['version'] == 'v2' and topic0 in (None, SYNC_TOPIC):
+                topic, encode_data = SYNC_TOPIC, lambda block_number: encode(['uint112', 'uint112'], self.reserves(pool.lower(), block_number)[:2])
+            elif info['version'] == 'v3' and topic0 in (None, SWAP_TOPIC):
+                def encode_data(block_number):
+                    sqrt_price_x96, tick = self.slot0(pool.lower(), block_number)[:2]
+                    return encode(['int256', 'int256', 'uint160', 'uint128', 'int24'], [1, -1, sqrt_price_x96, 10 ** 18, tick])
+                topic = SWAP_TOPIC
+            else:
+                continue
+
+            for epoch in range(self.epoch(pool.lower(), from_block), self.epoch(pool.lower(), to_block) + 1):
+                block_number = self.epoch_start(pool.lower(), epoch)
+                if from_block <= block_number <= to_block:
+                    logs.append({
+                        'address': to_checksum_address(pool),
+                        'topics': [topic],
+                        'data': '0x' + encode_data(block_number).hex(),
+                        'blockNumber': hex(block_number),
+                        'blockHash': '0x' + self.block_hash(block_number).hex(),
+                        'transactionHash': '0x' + keccak(text=f'{pool}:{block_number}').hex(),
+                        'transactionIndex': '0x0',
+                        'logIndex': hex(list(self.pools).index(pool.lower())),
+                        'removed': False,
+                    })
+
+        return sorted(logs, key=lambda log: (int(log['blockNumber'], 16), int(log['logIndex'], 16)))
+
+    def get_block(self, block_number):
+        return {
+            'number': hex(block_number),
+            'hash': '0x' + self.block_hash(block_number).hex(),
+            'parentHash': '0x' + self.block_hash(block_number - 1).hex(),
+            'timestamp': hex(self.block_timestamp(block_number)),
+        }
+
+#####################################################
+class MockNode:
+    """
+    Local JSON-RPC server answering from a MockChain, with configurable latency and rate limit.
+
+    Counts requests, calls per method and bytes in both directions, so the RPC cost of a pipeline
+    can be measured without a real node. Use as a context manager, or call start() and stop().
+
+    Parameters:
+    - chain (MockChain): The synthetic chain to serve.
+    - latency (float): Seconds added to every HTTP request.
+    - rate_limit (float): If set, requests per second above which HTTP 429 is returned.
+    - burst (float): The token bucket size of the rate limit.
+    - max_log_blocks (int): If set, eth_getLogs queries spanning more blocks are rejected.
+    """
+
+    def __init__(self, chain=None, latency=0.0, rate_limit=None, burst=None, max_log_blocks=None):
+        self.chain = chain or MockChain()
+        self.latency = latency
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.max_log_blocks = max_log_blocks
+        self.lock = threading.Lock()
+        self.server = None
+        self.reset_stats()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status, response = node.handle(body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def reset_stats(self):
+        with self.lock:
+            self.http_requests = 0
+            self.rate_limited = 0
+            self.calls = Counter()
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'http_requests': self.http_requests,
+                'rate_limited': self.rate_limited,
+                'rpc_calls': sum(self.calls.values()),
+                'calls_by_method': dict(self.calls),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+            }
+
+    #####################################################
+    def handle(self, body):
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.bucket is not None and not self.bucket.try_acquire():
+            response = json.dumps({'jsonrpc': '2.0', 'id': None, 'error': {'code': 429, 'message': 'rate limit exceeded'}}).encode()
+            with self.lock:
+                self.http_requests += 1
+                self.rate_limited += 1
+                self.bytes_in += len(body)
+                self.bytes_out += len(response)
+            return 429, response
+
+        request = json.loads(body)
+        requests = request if isinstance(request, list) else [request]
+        responses = [self.handle_call(call) for call in requests]
+        response = json.dumps(responses if isinstance(request, list) else responses[0]).encode()
+
+        with self.lock:
+            self.http_requests += 1
+            self.calls.update(call['method'] for call in requests)
+            self.bytes_in += len(body)
+            self.bytes_out += len(response)
+        return 200, response
+
+    def handle_call(self, call):
+        method, params = call['method'], call.get('params', [])
+        try:
+            result = self.dispatch(method, params)
+        except ValueError as error:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32000, 'message': str(error)}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+    def block_number(self, block_identifier):
+        if block_identifier in (None, 'latest', 'safe', 'finalized', 'pending'):
+            return self.chain.head_block
+        if block_identifier == 'earliest':
+            return 0
+        return int(block_identifier, 16)
+
+    def dispatch(self, method, params):
+        if method == 'eth_chainId':
+            return '0x1'
+        if method == 'net_version':
+            return '1'
+        if method == 'eth_blockNumber':
+            return hex(self.chain.head_block)
+        if method == 'eth_getBlockByNumber':
+            return self.chain.get_block(self.block_number(params[0]))
+        if method == 'eth_call':
+            transaction, block_identifier = params[0], params[1] if len(params) > 1 else 'latest'
+            data = bytes.fromhex(transaction['data'][2:])
+            return '0x' + self.chain.call(transaction['to'], data, self.block_number(block_identifier)).hex()
+        if method == 'eth_getStorageAt':
+            address, slot, block_identifier = params[0], int(params[1], 16), params[2] if len(params) > 2 else 'latest'
+            return '0x' + self.chain.storage_at(address, slot, self.block_number(block_identifier)).to_bytes(32, 'big').hex()
+        if method == 'eth_getLogs':
+            log_filter = params[0]
+            from_block, to_block = self.block_number(log_filter.get('fromBlock')), self.block_number(log_filter.get('toBlock'))
+            if self.max_log_blocks and to_block - from_block + 1 > self.max_log_blocks:
+                raise ValueError(f"query exceeds max block range {self.max_log_blocks}")
+            addresses = log_filter.get('address') or list(self.chain.pools)
+            addresses = [addresses] if isinstance(addresses, str) else addresses
+            topics = log_filter.get('topics') or [None]
+            return self.chain.get_logs(addresses, topics[0], from_block, to_block)
+        raise ValueError(f"the method {method} does not exist/is not available")
+
+#####################################################
+def _serve(connection, chain, node_kwargs):
+    # Runs in the MockNodeProcess child: serve until told to stop, answering stats() / reset_stats() over the pipe
+    with MockNode(chain, **node_kwargs) as node:
+        connection.send(node.url)
+        while True:
+            command = connection.recv()
+            if command == 'stop':
+                break
+            connection.send(getattr(node, command)())
+
+class MockNodeProcess:
+    """
+    MockNode served from a separate process, so the server's request handling neither competes with the
+    measured process for the GIL nor shows up in its memory profile. Same interface as MockNode
+    (url, chain, stats(), reset_stats(), context manager).
+
+    Parameters:
+    - chain (MockChain): The synthetic chain to serve (copied into the server process).
+    - **node_kwargs: The remaining arguments of MockNode (latency, rate_limit, ...).
+    """
+
+    def __init__(self, chain=None, **node_kwargs):
+        self.chain = chain or MockChain()
+        self.node_kwargs = node_kwargs
+        self.process = None
+        self.connection = None
+        self.url = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child_connection, self.chain, self.node_kwargs), daemon=True)
+        self.process.start()
+        while not self.connection.poll(0.1):
+            if not self.process.is_alive():
+                raise RuntimeError(f"Mock node process exited with code {self.process.exitcode} before serving.")
+        self.url = self.connection.recv()
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.connection.send('stop')
+            self.process.join()
+            self.connection.close()
+            self.process = None
+
+    def _command(self, command):
+        self.connection.send(command)
+        return self.connection.recv()
+
+    def reset_stats(self):
+        self._command('reset_stats')
+
+    def stats(self):
+        return self._command('stats')
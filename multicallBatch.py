@@ -0,0 +1,231 @@
+import time
+
+from pipelineStats import stats
+from rpcClient import load_abi
+
+# Multicall3 is deployed at the same address on mainnet and most EVM chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+# First mainnet block at which the Multicall3 contract exists
+MULTICALL3_DEPLOY_BLOCK = 14353601
+
+# Function selectors of the pool/token reads we batch
+GET_RESERVES_SELECTOR = bytes.fromhex('0902f1ac')  # getReserves()
+SLOT0_SELECTOR = bytes.fromhex('3850c7bd')  # slot0()
+DECIMALS_SELECTOR = bytes.fromhex('313ce567')  # decimals()
+TOKEN0_SELECTOR = bytes.fromhex('0dfe1681')  # token0()
+TOKEN1_SELECTOR = bytes.fromhex('d21220a7')  # token1()
+OBSERVE_SELECTOR = bytes.fromhex('883bdbfd')  # observe(uint32[])
+OBSERVATIONS_SELECTOR = bytes.fromhex('252c09d7')  # observations(uint256)
+
+# Multicall3 ABI (aggregate3 only)
+MULTICALL3_ABI = 'multicall3_abi.json'
+
+#####################################################
+def get_multicall_contract(w3):
+    return w3.eth.contract(address=MULTICALL3_ADDRESS, abi=load_abi(MULTICALL3_ABI))
+
+#####################################################
+def aggregate3(w3, calls, block_identifier='latest'):
+    """
+    Execute a list of read calls in a single eth_call through Multicall3.
+
+    Parameters:
+    - w3 (Web3): The Web3 instance to use.
+    - calls (list): A list of (target_address, call_data) tuples.
+    - block_identifier (int or str): The block at which to execute the calls.
+
+    Returns:
+    - list: The raw return data (bytes) of each call, or None where the call reverted.
+    """
+    if not calls:
+        return []
+    started = time.perf_counter()
+
+    # Multicall3 does not exist before its deployment block, so fall back to one eth_call per read,
+    # all sent in a single JSON-RPC batch
+    if isinstance(block_identifier, int) and block_identifier < MULTICALL3_DEPLOY_BLOCK:
+        requests = _eth_call_requests(calls, block_identifier)
+        make_batch_request = getattr(w3.provider, 'make_batch_request', None)
+        if make_batch_request is not None:
+            responses = make_batch_request(requests)
+        else:
+            responses = [w3.provider.make_request(method, params) for method, params in requests]
+        results = _eth_call_results(responses)
+        elapsed = time.perf_counter() - started
+        stats.record_rpc('batch' if make_batch_request is not None else 'eth_call', elapsed)
+        stats.record_calls(calls, elapsed)
+        return results
+
+    multicall_contract = get_multicall_contract(w3)
+    call3 = [(target, True, call_data) for target, call_data in calls]
+    results = multicall_contract.functions.aggregate3(call3).call(block_identifier=block_identifier)
+    stats.record_calls(calls, time.perf_counter() - started)
+
+    return [bytes(return_data) if success else None for success, return_data in results]
+
+async def aggregate3_async(w3, calls, block_identifier='latest'):
+    """
+    Same as aggregate3, for an AsyncWeb3 instance.
+    """
+    if not calls:
+        return []
+    started = time.perf_counter()
+
+    if isinstance(block_identifier, int) and block_identifier < MULTICALL3_DEPLOY_BLOCK:
+        requests = _eth_call_requests(calls, block_identifier)
+        make_batch_request = getattr(w3.provider, 'make_batch_request', None)
+        if make_batch_request is not None:
+            responses = await make_batch_request(requests)
+        else:
+            responses = [await w3.provider.make_request(method, params) for method, params in requests]
+        results = _eth_call_results(responses)
+        elapsed = time.perf_counter() - started
+        stats.record_rpc('batch' if make_batch_request is not None else 'eth_call', elapsed)
+        stats.record_calls(calls, elapsed)
+        return results
+
+    multicall_contract = get_multicall_contract(w3)
+    call3 = [(target, True, call_data) for target, call_data in calls]
+    results = await multicall_contract.functions.aggregate3(call3).call(block_identifier=block_identifier)
+    stats.record_calls(calls, time.perf_counter() - started)
+
+    return [bytes(return_data) if success else None for success, return_data in results]
+
+def _eth_call_requests(calls, block_number):
+    return [('eth_call', [{'to': target, 'data': '0x' + bytes(call_data).hex()}, hex(block_number)]) for target, call_data in calls]
+
+def _eth_call_results(responses):
+    # Raw JSON-RPC responses, in request order; a reverted call is None, like a failed aggregate3 call
+    if not isinstance(responses, list):
+        raise ValueError(f"eth_call batch failed: {responses.get('error')}")
+    return [None if 'error' in response or response.get('result') is None else bytes.fromhex(response['result'][2:])
+            for response in responses]
+
+#####################################################
+def decode_reserves(w3, return_data):
+    # getReserves() -> (uint112 reserve0, uint112 reserve1, uint32 blockTimestampLast)
+    return tuple(w3.codec.decode(['uint112', 'uint112', 'uint32'], return_data))
+
+def decode_slot0(w3, return_data):
+    # slot0() -> (sqrtPriceX96, tick, observationIndex, observationCardinality, observationCardinalityNext, feeProtocol, unlocked)
+    return tuple(w3.codec.decode(['uint160', 'int24', 'uint16', 'uint16', 'uint16', 'uint8', 'bool'], return_data))
+
+def decode_uint(w3, return_data):
+    return w3.codec.decode(['uint256'], return_data)[0]
+
+def decode_address(w3, return_data):
+    return w3.to_checksum_address(w3.codec.decode(['address'], return_data)[0])
+
+#####################################################
+def _fetch(w3, targets, selector, decoder, block_identifier):
+    results = aggregate3(w3, [(target, selector) for target in targets], block_identifier)
+    return _decode_results(w3, targets, results, decoder, block_identifier)
+
+async def _fetch_async(w3, targets, selector, decoder, block_identifier):
+    results = await aggregate3_async(w3, [(target, selector) for target in targets], block_identifier)
+    return _decode_results(w3, targets, results, decoder, block_identifier)
+
+def _decode_results(w3, targets, results, decoder, block_identifier):
+    decoded = []
+    for target, return_data in zip(targets, results):
+        if return_data is None:
+            raise ValueError(f"Call to {target} failed at block {block_identifier}.")
+        decoded.append(decoder(w3, return_data))
+    return decoded
+
+def fetch_v2_reserves(w3, pair_addresses, block_number):
+    """
+    Read getReserves() of several Uniswap V2 pairs at one block in a single round trip.
+
+    Parameters:
+    - w3 (Web3): The Web3 instance to use.
+    - pair_addresses (list): The contract addresses of the Uniswap V2 pairs.
+    - block_number (int): The block number at which to read the reserves.
+
+    Returns:
+    - list: One (reserve0, reserve1, blockTimestampLast) tuple per pair, in input order.
+    """
+    return _fetch(w3, pair_addresses, GET_RESERVES_SELECTOR, decode_reserves, block_number)
+
+def fetch_v3_slot0(w3, pool_addresses, block_number):
+    """
+    Read slot0() of several Uniswap V3 pools at one block in a single round trip.
+
+    Parameters:
+    - w3 (Web3): The Web3 instance to use.
+    - pool_addresses (list): The contract addresses of the Uniswap V3 pools.
+    - block_number (int): The block number at which to read slot0.
+
+    Returns:
+    - list: One decoded slot0 tuple per pool, in input order.
+    """
+    return _fetch(w3, pool_addresses, SLOT0_SELECTOR, decode_slot0, block_number)
+
+async def fetch_v2_reserves_async(w3, pair_addresses, block_number):
+    return await _fetch_async(w3, pair_addresses, GET_RESERVES_SELECTOR, decode_reserves, block_number)
+
+async def fetch_v3_slot0_async(w3, pool_addresses, block_number):
+    return await _fetch_async(w3, pool_addresses, SLOT0_SELECTOR, decode_slot0, block_number)
+
+def fetch_decimals(w3, token_addresses, block_identifier='latest'):
+    return _fetch(w3, token_addresses, DECIMALS_SELECTOR, decode_uint, block_identifier)
+
+def fetch_token_addresses(w3, pair_addresses, block_identifier='latest'):
+    """
+    Read token0() and token1() of several V2 pairs or V3 pools in a single round trip.
+
+    Returns:
+    - list: One (token0_address, token1_address) tuple per pair, in input order.
+    """
+    targets = []
+    for pair_address in pair_addresses:
+        targets.append((pair_address, TOKEN0_SELECTOR))
+        targets.append((pair_address, TOKEN1_SELECTOR))
+    results = aggregate3(w3, targets, block_identifier)
+    if any(return_data is None for return_data in results):
+        raise ValueError("token0()/token1() call failed for one of the pairs.")
+    addresses = [decode_address(w3, return_data) for return_data in results]
+    return list(zip(addresses[0::2], addresses[1::2]))
+
+def fetch_v3_observe(w3, calls, block_identifier='latest'):
+    """
+    Run observe(secondsAgos) on several Uniswap V3 pools in a single round trip.
+
+    Parameters:
+    - w3 (Web3): The Web3 instance to use.
+    - calls (list): (pool_address, seconds_agos) tuples; a pool may appear several times.
+    - block_identifier (int or str): The block at which to observe.
+
+    Returns:
+    - list: The tickCumulatives list of each call, or None where observe reverted
+      (e.g. a secondsAgo older than the pool's oldest observation).
+    """
+    targets = [(pool_address, OBSERVE_SELECTOR + w3.codec.encode(['uint32[]'], [list(seconds_agos)])) for pool_address, seconds_agos in calls]
+    results = aggregate3(w3, targets, block_identifier)
+    return [None if return_data is None else list(w3.codec.decode(['int56[]', 'uint160[]'], return_data)[0]) for return_data in results]
+
+def fetch_v3_oldest_observation_timestamps(w3, pool_addresses, block_identifier='latest'):
+    """
+    Read the timestamp of the oldest observation held in the oracle ring buffer of several V3 pools.
+
+    The oldest observation sits right after the current one (slot0().observationIndex), unless the
+    buffer has not wrapped around yet, in which case it is observation 0.
+
+    Returns:
+    - list: One unix timestamp per pool, in input order.
+    """
+    slot0s = _fetch(w3, pool_addresses, SLOT0_SELECTOR, decode_slot0, block_identifier)
+    targets = []
+    for pool_address, slot0 in zip(pool_addresses, slot0s):
+        observation_index, cardinality = slot0[2], max(1, slot0[3])
+        for index in ((observation_index + 1) % cardinality, 0):
+            targets.append((pool_address, OBSERVATIONS_SELECTOR + w3.codec.encode(['uint256'], [index])))
+    results = aggregate3(w3, targets, block_identifier)
+    if any(return_data is None for return_data in results):
+        raise ValueError("observations() call failed for one of the pools.")
+
+    observations = [w3.codec.decode(['uint32', 'int56', 'uint160', 'bool'], return_data) for return_data in results]
+    timestamps = []
+    for next_observation, first_observation in zip(observations[0::2], observations[1::2]):
+        timestamps.append(next_observation[0] if next_observation[3] else first_observation[0])
+    return timestamps
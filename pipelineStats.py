@@ -0,0 +1,261 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from web3.middleware import Web3Middleware
+
+# Upper bounds (seconds) of the latency histogram buckets, as in the Prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+METRIC_PREFIX = 'crypto_prices'
+
+# Contract function selectors -> names, for attributing batched calls
+CALL_NAMES = {
+    '0902f1ac': 'getReserves',
+    '3850c7bd': 'slot0',
+    '313ce567': 'decimals',
+    '0dfe1681': 'token0',
+    'd21220a7': 'token1',
+    '883bdbfd': 'observe',
+    '252c09d7': 'observations',
+}
+
+#####################################################
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self):
+        cumulative, buckets = 0, {}
+        for upper_bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets['+Inf' if upper_bound == float('inf') else str(upper_bound)] = cumulative
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else 0.0, 'buckets': buckets}
+
+#####################################################
+class PipelineStats:
+    """
+    Thread-safe counters and latency histograms of a pricing run.
+
+    - rpc: JSON-RPC requests by method (count, errors, latency histogram).
+    - calls: contract reads by function name (count, latency of the eth_call carrying them) and by target address.
+    - caches: hits and misses of the state cache and the pool registry.
+    - stages: time spent in fetch, decode, compute and write.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.rpc = {}
+            self.rpc_errors = {}
+            self.calls = {}
+            self.calls_by_target = {}
+            self.cache_hits = {}
+            self.cache_misses = {}
+            self.stages = {}
+
+    def record_rpc(self, method, seconds, ok=True):
+        with self.lock:
+            self.rpc.setdefault(method, Histogram()).observe(seconds)
+            if not ok:
+                self.rpc_errors[method] = self.rpc_errors.get(method, 0) + 1
+
+    def record_calls(self, calls, seconds):
+        """
+        Record the contract reads batched in one eth_call, as (target_address, call_data) tuples.
+        """
+        with self.lock:
+            names = set()
+            for target, call_data in calls:
+                name = CALL_NAMES.get(bytes(call_data[:4]).hex(), bytes(call_data[:4]).hex())
+                names.add(name)
+                key = (name, str(target).lower())
+                self.calls_by_target[key] = self.calls_by_target.get(key, 0) + 1
+            for name in names:
+                self.calls.setdefault(name, Histogram()).observe(seconds)
+
+    def record_cache(self, cache, hits, misses):
+        with self.lock:
+            self.cache_hits[cache] = self.cache_hits.get(cache, 0) + hits
+            self.cache_misses[cache] = self.cache_misses.get(cache, 0) + misses
+
+    def record_stage(self, stage, seconds):
+        with self.lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    #####################################################
+    def snapshot(self):
+        """
+        Return every statistic as a JSON-serialisable dict.
+        """
+        with self.lock:
+            return {
+                'elapsed': time.time() - self.started,
+                'rpc': {method: dict(histogram.to_dict(), errors=self.rpc_errors.get(method, 0)) for method, histogram in self.rpc.items()},
+                'calls': {name: histogram.to_dict() for name, histogram in self.calls.items()},
+                'calls_by_target': [{'call': name, 'target': target, 'count': count} for (name, target), count in sorted(self.calls_by_target.items())],
+                'caches': {
+                    cache: {
+                        'hits': self.cache_hits.get(cache, 0),
+                        'misses': self.cache_misses.get(cache, 0),
+                        'hit_rate': self.cache_hits.get(cache, 0) / max(1, self.cache_hits.get(cache, 0) + self.cache_misses.get(cache, 0)),
+                    }
+                    for cache in sorted(set(self.cache_hits) | set(self.cache_misses))
+                },
+                'stages': {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=1)
+
+    def to_prometheus(self):
+        """
+        Return every statistic in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def histogram(name, label, values, help_text):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} histogram')
+            for label_value, data in values.items():
+                for upper_bound, count in data['buckets'].items():
+                    lines.append(f'{METRIC_PREFIX}_{name}_bucket{{{label}="{label_value}",le="{upper_bound}"}} {count}')
+                lines.append(f'{METRIC_PREFIX}_{name}_sum{{{label}="{label_value}"}} {data["sum"]}')
+                lines.append(f'{METRIC_PREFIX}_{name}_count{{{label}="{label_value}"}} {data["count"]}')
+
+        def counter(name, samples, help_text):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} counter')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{label_value}"' for key, label_value in labels.items())
+                lines.append(f'{METRIC_PREFIX}_{name}{{{label_text}}} {value}')
+
+        histogram('rpc_latency_seconds', 'method', snapshot['rpc'], 'JSON-RPC request latency by method.')
+        counter('rpc_errors_total', [({'method': method}, data['errors']) for method, data in snapshot['rpc'].items()], 'Failed JSON-RPC requests by method.')
+        histogram('call_latency_seconds', 'call', snapshot['calls'], 'Latency of the eth_call carrying each contract read.')
+        counter('calls_total', [({'call': row['call'], 'target': row['target']}, row['count']) for row in snapshot['calls_by_target']], 'Contract reads by function and address.')
+        counter('cache_hits_total', [({'cache': cache}, data['hits']) for cache, data in snapshot['caches'].items()], 'Cache hits.')
+        counter('cache_misses_total', [({'cache': cache}, data['misses']) for cache, data in snapshot['caches'].items()], 'Cache misses.')
+        histogram('stage_seconds', 'stage', snapshot['stages'], 'Time spent per pipeline stage.')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Write the statistics to path, in Prometheus text format if it ends with .prom, in JSON otherwise.
+        """
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            f.write(text)
+        os.replace(temporary_path, path)
+
+    def dump_every(self, path, interval=60):
+        """
+        Dump the statistics to path every interval seconds on a background thread, e.g. for a node
+        exporter textfile collector during a long backfill.
+
+        Returns:
+        - threading.Event: Set it to stop dumping (a last dump is written on the way out).
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.dump(path)
+            self.dump(path)
+
+        threading.Thread(target=run, daemon=True).start()
+        return stop
+
+#####################################################
+# Statistics of the current process, fed by the instrumented functions and connections
+stats = PipelineStats()
+
+def get_stats():
+    return stats
+
+_active_stages = threading.local()
+
+def timed(stage):
+    """
+    Decorator adding the run time of a function to a pipeline stage. Calls nested inside a function
+    already timed under the same stage (e.g. recursive fetches) are not counted twice.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            active = _active_stages.__dict__.setdefault('stages', set())
+            if stage in active:
+                return function(*args, **kwargs)
+            active.add(stage)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                active.discard(stage)
+                stats.record_stage(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+#####################################################
+class StatsMiddleware(Web3Middleware):
+    """
+    Web3 middleware timing every JSON-RPC request by method into the process statistics.
+    """
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            started = time.perf_counter()
+            ok = False
+            try:
+                response = make_request(method, params)
+                ok = 'error' not in response
+                return response
+            finally:
+                stats.record_rpc(method, time.perf_counter() - started, ok)
+        return middleware
+
+    def wrap_make_batch_request(self, make_batch_request):
+        def middleware(requests_info):
+            started = time.perf_counter()
+            ok = False
+            try:
+                response = make_batch_request(requests_info)
+                ok = isinstance(response, list)
+                return response
+            finally:
+                stats.record_rpc('batch', time.perf_counter() - started, ok)
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            started = time.perf_counter()
+            ok = False
+            try:
+                response = await make_request(method, params)
+                ok = 'error' not in response
+                return response
+            finally:
+                stats.record_rpc(method, time.perf_counter() - started, ok)
+        return middleware
+
+def add_stats_middleware(w3):
+    w3.middleware_onion.add(StatsMiddleware, 'stats')
+    return w3
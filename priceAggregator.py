@@ -0,0 +1,250 @@
+import json
+import math
+import sqlite3
+from collections import deque
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+# Default location of the on-disk aggregation state
+DEFAULT_AGGREGATE_PATH = 'priceAggregates.sqlite'
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'twap', 'vwap', 'volume', 'observations', 'rolling_twap']
+
+#####################################################
+class _SeriesState:
+    """
+    Running aggregates of one price column: the open bar, the last observation and the rolling window.
+
+    A price holds from its block (or timestamp) until the next observation, so TWAPs weight each price by
+    how long it held and sparse series (change points, time samples) aggregate the same as dense ones.
+    """
+
+    def __init__(self, bucket_size, rolling_size=None):
+        self.bucket_size = bucket_size
+        self.rolling_size = rolling_size
+        self.last_key = None
+        self.last_price = None
+        self.bar = None
+        # Rolling window as (start, end, price) segments and their summed price * duration
+        self.segments = deque()
+        self.rolling_area = 0.0
+        self.rolling_duration = 0
+        # Segments appended since the window was last saved
+        self.unsaved_segments = 0
+
+    def _open_bar(self, bucket, price):
+        self.bar = {'bucket': bucket, 'open': price, 'high': price, 'low': price, 'close': price,
+                    'area': 0.0, 'duration': 0, 'price_volume': 0.0, 'volume': 0.0, 'observations': 0}
+
+    def _bar_row(self, bar):
+        return {
+            'open': bar['open'], 'high': bar['high'], 'low': bar['low'], 'close': bar['close'],
+            'twap': bar['area'] / bar['duration'] if bar['duration'] else bar['close'],
+            'vwap': bar['price_volume'] / bar['volume'] if bar['volume'] else math.nan,
+            'volume': bar['volume'],
+            'observations': bar['observations'],
+            'rolling_twap': self.rolling_twap(),
+        }
+
+    def rolling_twap(self):
+        return self.rolling_area / self.rolling_duration if self.rolling_duration else math.nan
+
+    def _roll(self, start, end, price):
+        self.segments.append([start, end, price])
+        self.unsaved_segments += 1
+        self.rolling_area += price * (end - start)
+        self.rolling_duration += end - start
+        window_start = end - self.rolling_size
+        while self.segments[0][1] <= window_start:
+            segment_start, segment_end, segment_price = self.segments.popleft()
+            self.rolling_area -= segment_price * (segment_end - segment_start)
+            self.rolling_duration -= segment_end - segment_start
+        if self.segments[0][0] < window_start:
+            segment = self.segments[0]
+            self.rolling_area -= segment[2] * (window_start - segment[0])
+            self.rolling_duration -= window_start - segment[0]
+            segment[0] = window_start
+
+    def _accrue(self, end, closed_bars):
+        # The last price held over [last_key, end); close every bar it runs past
+        start, price = self.last_key, self.last_price
+        while start < end:
+            bucket_end = (self.bar['bucket'] + 1) * self.bucket_size
+            stop = min(end, bucket_end)
+            self.bar['area'] += price * (stop - start)
+            self.bar['duration'] += stop - start
+            if self.rolling_size:
+                self._roll(start, stop, price)
+            if stop == bucket_end:
+                closed_bars.append((self.bar['bucket'] * self.bucket_size, self._bar_row(self.bar)))
+                self._open_bar(self.bar['bucket'] + 1, price)
+            start = stop
+
+    def update(self, key, price, volume, closed_bars):
+        """
+        Add one observation in O(1) (amortized over the bars it closes); keys already aggregated are skipped.
+        """
+        if self.last_key is not None and key <= self.last_key:
+            return
+        if self.bar is None:
+            self._open_bar(key // self.bucket_size, price)
+        else:
+            self._accrue(key, closed_bars)
+
+        bar = self.bar
+        if bar['observations'] == 0 and bar['area'] == 0:
+            bar['open'] = bar['high'] = bar['low'] = price
+        bar['high'] = max(bar['high'], price)
+        bar['low'] = min(bar['low'], price)
+        bar['close'] = price
+        bar['observations'] += 1
+        if volume:
+            bar['price_volume'] += price * volume
+            bar['volume'] += volume
+        self.last_key, self.last_price = key, price
+
+    def to_dict(self):
+        # The rolling window segments are saved row by row, see PriceAggregator._save
+        return {'last_key': self.last_key, 'last_price': self.last_price, 'bar': self.bar,
+                'rolling_area': self.rolling_area, 'rolling_duration': self.rolling_duration}
+
+    @classmethod
+    def from_dict(cls, data, bucket_size, rolling_size=None, segments=()):
+        state = cls(bucket_size, rolling_size)
+        state.last_key, state.last_price, state.bar = data['last_key'], data['last_price'], data['bar']
+        state.segments = deque([list(segment) for segment in segments])
+        state.rolling_area, state.rolling_duration = data['rolling_area'], data['rolling_duration']
+        return state
+
+#####################################################
+class PriceAggregator:
+    """
+    Incremental OHLC, TWAP, VWAP and rolling TWAP bars over the DataFrames of the create_price_dataframe_*
+    functions, persisted in SQLite.
+
+    Each observation is folded into the open bar of its column in constant time, and the closed bars, the
+    open state and the changes to the rolling window are saved after every update, so extending a range or
+    following the head only processes (and writes) the new rows. Bars are keyed by the DataFrame index: block numbers (block-weighted TWAP, 300 blocks ~ 1 hour)
+    or the timestamps of blockTimestamps.create_price_dataframe_by_time (time-weighted TWAP, 3600 = 1 hour).
+    Aggregated rows are never revisited, so when following the head only feed confirmed blocks
+    (headFollower.follow_head with confirmations deeper than any expected reorg).
+
+    The price DataFrames carry no traded volume, so vwap is NaN and volume 0 unless the caller passes a
+    volume per row to update() (e.g. summed from the pools' Swap events).
+
+    Parameters:
+    - path (str): The SQLite file holding the bars and the state, None for an in-memory aggregator.
+    - bucket_size (int): The bar length, in units of the index.
+    - rolling_size (int): If set, the length of the rolling TWAP window, reported as each bar's rolling_twap.
+    """
+
+    def __init__(self, path=DEFAULT_AGGREGATE_PATH, bucket_size=300, rolling_size=None):
+        self.path = path
+        self.connection = sqlite3.connect(path or ':memory:', timeout=60)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS bars (series TEXT NOT NULL, start INTEGER NOT NULL, '
+            + ', '.join(f'{column} REAL' for column in BAR_COLUMNS) + ', PRIMARY KEY (series, start)) WITHOUT ROWID')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS state (series TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS rolling_segments (series TEXT NOT NULL, segment_end INTEGER NOT NULL, '
+            'segment_start INTEGER NOT NULL, price REAL NOT NULL, PRIMARY KEY (series, segment_end)) WITHOUT ROWID')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value INTEGER)')
+        self.connection.commit()
+
+        settings = dict(self.connection.execute('SELECT name, value FROM settings'))
+        if settings and (settings.get('bucket_size'), settings.get('rolling_size')) != (bucket_size, rolling_size):
+            raise ValueError(f"{path} holds bars of bucket_size={settings.get('bucket_size')}, rolling_size={settings.get('rolling_size')}.")
+        self.bucket_size = bucket_size
+        self.rolling_size = rolling_size
+
+        segments = {}
+        for column, segment_start, segment_end, price in self.connection.execute(
+                'SELECT series, segment_start, segment_end, price FROM rolling_segments ORDER BY series, segment_end'):
+            segments.setdefault(column, []).append((segment_start, segment_end, price))
+        self.series = {
+            column: _SeriesState.from_dict(json.loads(value), bucket_size, rolling_size, segments.get(column, ()))
+            for column, value in self.connection.execute('SELECT series, value FROM state')
+        }
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, df, columns=None, volume=None):
+        """
+        Fold the new rows of a price DataFrame into the bars and save the result.
+
+        Parameters:
+        - df (DataFrame): Prices indexed by block number or timestamp, in increasing order. Rows at or before
+          the last aggregated key of a column are skipped, so overlapping ranges can be passed again.
+        - columns (list): The price columns to aggregate, every float column except block_number by default.
+        - volume (Series/array): Traded volume per row, used for VWAP and the volume column. Without it vwap is NaN.
+
+        Returns:
+        - int: The number of bars closed by this update.
+        """
+        if columns is None:
+            columns = [column for column in df.columns if column != 'block_number' and pd.api.types.is_float_dtype(df[column])]
+        keys = df.index.to_numpy(dtype=np.int64)
+        volumes = np.zeros(len(df)) if volume is None else np.asarray(volume, dtype=np.float64)
+
+        closed_bars = []
+        for column in columns:
+            state = self.series.setdefault(column, _SeriesState(self.bucket_size, self.rolling_size))
+            column_bars = []
+            for key, price, row_volume in zip(keys.tolist(), df[column].to_numpy(dtype=np.float64).tolist(), volumes.tolist()):
+                if not math.isnan(price):
+                    state.update(key, price, row_volume, column_bars)
+            closed_bars.extend((column, start, row) for start, row in column_bars)
+
+        self._save(closed_bars)
+        return len(closed_bars)
+
+    def _save(self, closed_bars):
+        # Bars and state in one transaction, so an interrupted run resumes from a consistent point
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?), (?, ?)',
+                                    ('bucket_size', self.bucket_size, 'rolling_size', self.rolling_size))
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO bars (series, start, {", ".join(BAR_COLUMNS)}) VALUES ({", ".join("?" * (len(BAR_COLUMNS) + 2))})',
+                [(column, start, *(row[name] for name in BAR_COLUMNS)) for column, start, row in closed_bars])
+            self.connection.executemany('INSERT OR REPLACE INTO state (series, value) VALUES (?, ?)',
+                                        [(column, json.dumps(state.to_dict())) for column, state in self.series.items()])
+            if self.rolling_size:
+                self._save_segments()
+
+    def _save_segments(self):
+        # Only the segments appended since the last save are written, and the ones that left the window
+        # deleted, so the cost per update does not grow with the window
+        for column, state in self.series.items():
+            if not state.segments:
+                continue
+            new_segments = islice(reversed(state.segments), state.unsaved_segments)
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO rolling_segments (series, segment_end, segment_start, price) VALUES (?, ?, ?, ?)',
+                [(column, segment_end, segment_start, price) for segment_start, segment_end, price in new_segments])
+            first_start, first_end, _ = state.segments[0]
+            self.connection.execute('DELETE FROM rolling_segments WHERE series = ? AND segment_end < ?', (column, first_end))
+            # The first segment is cut at the start of the window as the window moves
+            self.connection.execute('UPDATE rolling_segments SET segment_start = ? WHERE series = ? AND segment_end = ?',
+                                    (first_start, column, first_end))
+            state.unsaved_segments = 0
+
+    def bars(self, column, include_open=False):
+        """
+        Return the bars of one price column as a DataFrame indexed by the start of each bar.
+
+        Parameters:
+        - column (str): The price column, e.g. 'coin0_price_in_usd'.
+        - include_open (bool): Also return the bar still being filled (its TWAP only covers up to the last observation).
+        """
+        df = pd.read_sql_query(f'SELECT start, {", ".join(BAR_COLUMNS)} FROM bars WHERE series = ? ORDER BY start',
+                               self.connection, params=(column,), index_col='start')
+        state = self.series.get(column)
+        if include_open and state is not None and state.bar is not None:
+            df.loc[state.bar['bucket'] * self.bucket_size] = state._bar_row(state.bar)
+        # SQLite returns NULL (None) for NaN, e.g. the vwap of bars without volume
+        df = df.astype({column: np.float64 for column in BAR_COLUMNS})
+        df['observations'] = df['observations'].astype(np.int64)
+        return df
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from pipelineStats import timed
+
+# Price columns produced by every create_price_dataframe_* function
+PRICE_COLUMNS = ['coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
+
+#####################################################
+def reciprocal(prices):
+    """
+    Elementwise 1 / prices, with 0 where the price is 0.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    return np.divide(1.0, prices, out=np.zeros_like(prices), where=prices != 0)
+
+#####################################################
+@timed('write')
+def build_price_dataframe(start_block, end_block, prices, file_name=None):
+    """
+    Build the price DataFrame of a block range in one step from whole price columns.
+
+    Parameters:
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - prices (dict): Column name -> array with one value per block (or a scalar repeated for every block).
+    - file_name (str): If set, the DataFrame is also saved to this CSV file.
+
+    Returns:
+    - DataFrame: The prices indexed by block_number, with the columns in PRICE_COLUMNS order.
+    """
+    block_count = end_block - start_block + 1
+    index = pd.Index(np.arange(start_block, end_block + 1, dtype=np.int64), name='block_number')
+    df = pd.DataFrame({column: np.full(block_count, prices[column], dtype=np.float64) for column in PRICE_COLUMNS}, index=index)
+
+    if file_name:
+        df.to_csv(file_name, index=True)
+
+    return df
@@ -0,0 +1,215 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import tokenPriceUniV2 as uni_v2
+import tokenPriceUniV3 as uni_v3
+from priceFrame import build_price_dataframe, reciprocal
+
+# Mainnet stablecoins treated as worth exactly 1 USD at the end of a route
+USDC_ADDRESS = '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48'
+USDT_ADDRESS = '0xdAC17F958D2ee523a2206206994597C13D831ec7'
+DAI_ADDRESS = '0x6B175474E89094C44Da98b954EedeAC495271d0F'
+USD_TOKENS = {USDC_ADDRESS.lower(), USDT_ADDRESS.lower(), DAI_ADDRESS.lower()}
+
+#####################################################
+def get_pool_info(version, pool_address):
+    if version == 'v2':
+        return uni_v2.registry.get_pool(pool_address)
+    elif version == 'v3':
+        return uni_v3.registry.get_pool(pool_address)
+    else:
+        raise ValueError("Invalid pool version. Must be 'v2' or 'v3'.")
+
+#####################################################
+def resolve_route(route, usd_tokens=USD_TOKENS):
+    """
+    Work out which token a route prices and in which direction every hop is crossed.
+
+    Parameters:
+    - route (list): (version, pool_address) hops from the priced token to a USD stablecoin,
+      e.g. [('v3', NATI_ETH), ('v3', USDC_ETH)]. version is 'v2' or 'v3'.
+    - usd_tokens (set): Lower-case addresses of the tokens worth 1 USD.
+
+    Returns:
+    - tuple: (priced_token_address, hops) where hops is a list of (version, pool_address, sell_token0);
+      sell_token0 is True when the hop converts token0 of the pool into token1.
+    """
+    if not route:
+        raise ValueError("A route needs at least one pool.")
+    pools = [get_pool_info(version, pool_address) for version, pool_address in route]
+
+    # The priced token is the side of the first pool that is not shared with the next hop (or not USD for a single pool)
+    first_tokens = [pools[0]['token0'], pools[0]['token1']]
+    if len(pools) > 1:
+        next_tokens = {pools[1]['token0'].lower(), pools[1]['token1'].lower()}
+        candidates = [token for token in first_tokens if token.lower() not in next_tokens]
+    else:
+        candidates = [token for token in first_tokens if token.lower() not in usd_tokens]
+    current = candidates[0] if candidates else first_tokens[0]
+    priced_token = current
+
+    hops = []
+    for (version, pool_address), pool in zip(route, pools):
+        if current.lower() == pool['token0'].lower():
+            hops.append((version, pool_address, True))
+            current = pool['token1']
+        elif current.lower() == pool['token1'].lower():
+            hops.append((version, pool_address, False))
+            current = pool['token0']
+        else:
+            raise ValueError(f"Route is broken at pool {pool_address}: it does not hold token {current}.")
+
+    if current.lower() not in usd_tokens:
+        raise ValueError(f"Route for {priced_token} ends in {current}, which is not a USD token.")
+
+    return priced_token, hops
+
+#####################################################
+def find_route(pools, token_address, usd_tokens=USD_TOKENS):
+    """
+    Find the shortest route from a token to any USD stablecoin through a graph of pools.
+
+    Parameters:
+    - pools (list): (version, pool_address) tuples available for routing.
+    - token_address (str): The token to price.
+    - usd_tokens (set): Lower-case addresses of the tokens worth 1 USD.
+
+    Returns:
+    - list: The route, as (version, pool_address) hops accepted by price_routes.
+    """
+    edges = {}
+    for version, pool_address in pools:
+        pool = get_pool_info(version, pool_address)
+        token0, token1 = pool['token0'].lower(), pool['token1'].lower()
+        edges.setdefault(token0, []).append((token1, (version, pool_address)))
+        edges.setdefault(token1, []).append((token0, (version, pool_address)))
+
+    start = token_address.lower()
+    previous = {start: None}
+    queue = deque([start])
+    while queue:
+        token = queue.popleft()
+        if token in usd_tokens and token != start:
+            route = []
+            while previous[token] is not None:
+                token, hop = previous[token]
+                route.append(hop)
+            return route[::-1]
+        for neighbour, hop in edges.get(token, ()):
+            if neighbour not in previous:
+                previous[neighbour] = (token, hop)
+                queue.append(neighbour)
+
+    raise ValueError(f"No route from {token_address} to a USD token.")
+
+#####################################################
+def fetch_pool_prices(pools, start_block, end_block, max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    """
+    Read every pool once per block and return the price of its token0 in token1 for the whole range.
+
+    Parameters:
+    - pools (list): Unique (version, pool_address) tuples.
+
+    Returns:
+    - dict: (version, lower-case pool_address) -> float64 array with one price per block.
+    """
+    prices = {}
+
+    v2_pools = [pool_address for version, pool_address in pools if version == 'v2']
+    if v2_pools:
+        reserve0, reserve1 = uni_v2.fetch_reserves_arrays(v2_pools, start_block, end_block, max_concurrency, use_logs, cache, adaptive, use_storage)
+        for column, (pool_address, pool) in enumerate(zip(v2_pools, uni_v2.registry.get_pools(v2_pools))):
+            prices[('v2', pool_address.lower())] = uni_v2.reserves_to_price(
+                (reserve0[:, column], reserve1[:, column]), pool['token0_decimals'], pool['token1_decimals'], 'token0')
+
+    v3_pools = [pool_address for version, pool_address in pools if version == 'v3']
+    if v3_pools:
+        ticks = uni_v3.fetch_ticks_array(v3_pools, start_block, end_block, max_concurrency, use_logs, cache, use_storage)
+        for column, (pool_address, pool) in enumerate(zip(v3_pools, uni_v3.registry.get_pools(v3_pools))):
+            prices[('v3', pool_address.lower())] = uni_v3.tick_to_price(
+                ticks[:, column], pool['token0_decimals'], pool['token1_decimals'], 'token0')
+
+    return prices
+
+#####################################################
+def price_routes(routes, start_block, end_block, file_name=None, max_concurrency=None, use_logs=False, cache=None, usd_tokens=USD_TOKENS, adaptive=False, use_storage=False):
+    """
+    Price many tokens in USD over a block range, each along its own route of V2/V3 pools.
+
+    Every pool is read once per block no matter how many routes go through it, so pricing 50 tokens
+    against USDC/ETH reads the USDC/ETH pool once per block, not 50 times.
+
+    Parameters:
+    - routes (dict): Column label -> route, a list of (version, pool_address) hops from the token to a
+      USD stablecoin, e.g. {'NATI': [('v3', NATI_ETH), ('v3', USDC_ETH)], 'ETH': [('v3', USDC_ETH)]}.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - file_name (str): If set, the DataFrame is also saved to this CSV file.
+    - max_concurrency, use_logs, cache, use_storage: Passed on to fetch_reserves_arrays / fetch_ticks_array.
+    - adaptive (bool): Passed on to fetch_reserves_arrays, so sparse V2 pairs are only read around their changes.
+    - usd_tokens (set): Lower-case addresses of the tokens worth 1 USD.
+
+    Returns:
+    - DataFrame: One '<label>_price_in_usd' column per route, indexed by block_number.
+    """
+    resolved = {label: resolve_route(route, usd_tokens)[1] for label, route in routes.items()}
+
+    # Each pool is fetched once, however many routes share it
+    unique_pools = {}
+    for hops in resolved.values():
+        for version, pool_address, _ in hops:
+            unique_pools.setdefault((version, pool_address.lower()), (version, pool_address))
+    pool_prices = fetch_pool_prices(list(unique_pools.values()), start_block, end_block, max_concurrency, use_logs, cache, adaptive, use_storage)
+
+    block_count = end_block - start_block + 1
+    columns = {}
+    for label, hops in resolved.items():
+        price_in_usd = np.ones(block_count, dtype=np.float64)
+        for version, pool_address, sell_token0 in hops:
+            price_token0_in_token1 = pool_prices[(version, pool_address.lower())]
+            price_in_usd *= price_token0_in_token1 if sell_token0 else reciprocal(price_token0_in_token1)
+        columns[f'{label}_price_in_usd'] = price_in_usd
+
+    df = pd.DataFrame(columns, index=pd.Index(np.arange(start_block, end_block + 1, dtype=np.int64), name='block_number'))
+    if file_name:
+        df.to_csv(file_name, index=True)
+
+    return df
+
+#####################################################
+def price_pair(version, start_block, end_block, target_pair_address, stable_pair_address, file_name=None, usd_tokens=USD_TOKENS, **kwargs):
+    """
+    Price both tokens of a pool, and each in USD through a second pool pairing one of them with a USD stablecoin
+    (e.g. ETH/DUCK through USDC/ETH). coin0 and coin1 are token0 and token1 of the target pool, as read from the registry.
+
+    Parameters:
+    - version (str): 'v2' or 'v3', the version of both pools.
+    - target_pair_address (str): The pool of the two priced tokens.
+    - stable_pair_address (str): The pool pairing one of them with a USD stablecoin.
+    - **kwargs: Passed on to price_routes (max_concurrency, use_logs, cache, adaptive, use_storage).
+
+    Returns:
+    - DataFrame: The PRICE_COLUMNS of build_price_dataframe, indexed by block_number.
+    """
+    target_pool = get_pool_info(version, target_pair_address)
+    stable_pool = get_pool_info(version, stable_pair_address)
+    stable_tokens = {stable_pool['token0'].lower(), stable_pool['token1'].lower()}
+
+    routes = {}
+    for label, token in (('coin0', target_pool['token0']), ('coin1', target_pool['token1'])):
+        if token.lower() in usd_tokens:
+            continue
+        routes[label] = [(version, stable_pair_address)] if token.lower() in stable_tokens else [(version, target_pair_address), (version, stable_pair_address)]
+    prices = price_routes(routes, start_block, end_block, usd_tokens=usd_tokens, **kwargs)
+
+    block_count = end_block - start_block + 1
+    coin0_price_in_usd = prices['coin0_price_in_usd'].to_numpy() if 'coin0' in routes else np.ones(block_count)
+    coin1_price_in_usd = prices['coin1_price_in_usd'].to_numpy() if 'coin1' in routes else np.ones(block_count)
+    return build_price_dataframe(start_block, end_block, {
+        'coin0_price_in_coin1': coin0_price_in_usd * reciprocal(coin1_price_in_usd),
+        'coin1_price_in_coin0': coin1_price_in_usd * reciprocal(coin0_price_in_usd),
+        'coin0_price_in_usd': coin0_price_in_usd,
+        'coin1_price_in_usd': coin1_price_in_usd,
+    }, file_name)
@@ -0,0 +1,209 @@
+import os
+import re
+
+import pandas as pd
+
+from pipelineStats import timed
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the Parquet sink
+    pa = pq = None
+
+# Rows per Parquet file; each flushed chunk is its own complete file, so a crash loses at most one chunk
+DEFAULT_ROW_GROUP_SIZE = 50000
+# Blocks covered by one partition directory
+DEFAULT_PARTITION_BLOCKS = 1000000
+
+PART_FILE_PATTERN = re.compile(r'^part-(\d+)-(\d+)\.parquet$')
+PARTITION_DIR_PATTERN = re.compile(r'^blocks=(\d+)-(\d+)$')
+
+#####################################################
+class ParquetPriceSink:
+    """
+    Streaming writer of price DataFrames to Parquet, partitioned by pool and block range.
+
+    Rows are buffered and flushed every row_group_size rows as a complete Parquet file under
+    root/pool=<pool>/blocks=<start>-<end>/part-<first>-<last>.parquet. Files are only rewritten by
+    rollback(), so reopening a sink on an existing root appends to it.
+    """
+
+    def __init__(self, root, pool, row_group_size=DEFAULT_ROW_GROUP_SIZE, partition_blocks=DEFAULT_PARTITION_BLOCKS):
+        if pq is None:
+            raise ImportError("ParquetPriceSink requires pyarrow (pip install pyarrow).")
+        self.root = root
+        self.pool = str(pool).lower()
+        self.row_group_size = row_group_size
+        self.partition_blocks = partition_blocks
+        self.buffer = []
+        self.buffered_rows = 0
+        self.partition = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def partition_of(self, block_number):
+        partition_start = block_number - block_number % self.partition_blocks
+        return partition_start, partition_start + self.partition_blocks - 1
+
+    @timed('write')
+    def write(self, df):
+        """
+        Add the rows of a price DataFrame indexed by block_number (ascending) to the sink.
+        """
+        if df.empty:
+            return
+        blocks = df.index.to_numpy()
+        start = 0
+        while start < len(df):
+            partition = self.partition_of(int(blocks[start]))
+            end = start + int((blocks[start:] <= partition[1]).sum())
+            if partition != self.partition:
+                self.flush()
+                self.partition = partition
+            self.buffer.append(df.iloc[start:end])
+            self.buffered_rows += end - start
+            start = end
+
+            while self.buffered_rows >= self.row_group_size:
+                pending = pd.concat(self.buffer)
+                self._write_file(pending.iloc[:self.row_group_size])
+                remainder = pending.iloc[self.row_group_size:]
+                self.buffer = [remainder] if len(remainder) else []
+                self.buffered_rows = len(remainder)
+
+    @timed('write')
+    def flush(self):
+        if self.buffered_rows:
+            self._write_file(pd.concat(self.buffer))
+        self.buffer = []
+        self.buffered_rows = 0
+
+    def close(self):
+        self.flush()
+
+    def rollback(self, block_number):
+        """
+        Discard every row after block_number, buffered or already written, e.g. after a chain reorg.
+        """
+        self.buffer = [df[df.index <= block_number] for df in self.buffer]
+        self.buffer = [df for df in self.buffer if len(df)]
+        self.buffered_rows = sum(len(df) for df in self.buffer)
+
+        for first, last, path in _part_files(self.root, self.pool, start_block=block_number + 1):
+            if first > block_number:
+                os.remove(path)
+                continue
+            kept = pq.read_table(path).to_pandas()
+            kept = kept[kept.index <= block_number]
+            temporary_path = os.path.join(os.path.dirname(path), f'part-{first}-{int(kept.index[-1])}.parquet.tmp')
+            pq.write_table(pa.Table.from_pandas(kept, preserve_index=True), temporary_path)
+            os.replace(temporary_path, temporary_path[:-len('.tmp')])
+            os.remove(path)
+
+    def _write_file(self, df):
+        partition_dir = os.path.join(pool_dir(self.root, self.pool), f'blocks={self.partition[0]}-{self.partition[1]}')
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f'part-{int(df.index[0])}-{int(df.index[-1])}.parquet')
+
+        # Write to a temporary name and rename, so a crash never leaves a truncated file behind
+        temporary_path = path + '.tmp'
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=True), temporary_path)
+        os.replace(temporary_path, path)
+
+    def last_block(self):
+        return last_block(self.root, self.pool)
+
+#####################################################
+def pool_dir(root, pool):
+    return os.path.join(root, f'pool={str(pool).lower()}')
+
+def _part_files(root, pool, start_block=None, end_block=None):
+    directory = pool_dir(root, pool)
+    if not os.path.isdir(directory):
+        return []
+
+    parts = []
+    for partition_name in os.listdir(directory):
+        partition_match = PARTITION_DIR_PATTERN.match(partition_name)
+        if not partition_match:
+            continue
+        for file_name in os.listdir(os.path.join(directory, partition_name)):
+            part_match = PART_FILE_PATTERN.match(file_name)
+            if not part_match:
+                continue
+            first, last = int(part_match.group(1)), int(part_match.group(2))
+            if (start_block is not None and last < start_block) or (end_block is not None and first > end_block):
+                continue
+            parts.append((first, last, os.path.join(directory, partition_name, file_name)))
+
+    return sorted(parts)
+
+def last_block(root, pool):
+    """
+    Return the highest block number stored for a pool, or None if nothing is stored yet.
+    """
+    parts = _part_files(root, pool)
+    return max(last for _, last, _ in parts) if parts else None
+
+def read_prices(root, pool, start_block=None, end_block=None):
+    """
+    Read back the prices stored for a pool, memory-mapping the Parquet files.
+
+    Parameters:
+    - root (str): The root directory of the sink.
+    - pool (str): The pool label or address used when writing.
+    - start_block (int): If set, the first block number to return.
+    - end_block (int): If set, the last block number to return (inclusive).
+
+    Returns:
+    - DataFrame: The prices indexed by block_number. Blocks written more than once keep the latest write.
+    """
+    if pq is None:
+        raise ImportError("read_prices requires pyarrow (pip install pyarrow).")
+
+    parts = _part_files(root, pool, start_block, end_block)
+    if not parts:
+        return pd.DataFrame()
+
+    df = pa.concat_tables([pq.read_table(path, memory_map=True) for _, _, path in parts]).to_pandas()
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    if start_block is not None:
+        df = df[df.index >= start_block]
+    if end_block is not None:
+        df = df[df.index <= end_block]
+
+    return df
+
+#####################################################
+def stream_price_dataframe(create_price_dataframe, sink, start_block, end_block, *args, chunk_blocks=None, resume=False, **kwargs):
+    """
+    Run a create_price_dataframe_* function chunk by chunk and write every chunk to a sink as soon as it completes.
+
+    Only one chunk of blocks is held in memory at a time, and with resume=True a rerun skips the blocks
+    the sink already holds.
+
+    Parameters:
+    - create_price_dataframe (function): One of the create_price_dataframe_* functions.
+    - sink (ParquetPriceSink): The sink receiving the rows.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - *args, **kwargs: The remaining arguments of create_price_dataframe (pair addresses, cache, ...).
+    - chunk_blocks (int): Blocks per chunk, the sink's row group size by default.
+    - resume (bool): If True, start after the last block already stored in the sink.
+    """
+    chunk_blocks = chunk_blocks or sink.row_group_size
+    if resume:
+        stored = sink.last_block()
+        if stored is not None:
+            start_block = max(start_block, stored + 1)
+
+    for chunk_start in range(start_block, end_block + 1, chunk_blocks):
+        chunk_end = min(chunk_start + chunk_blocks - 1, end_block)
+        sink.write(create_price_dataframe(chunk_start, chunk_end, *args, file_name=None, **kwargs))
+
+    sink.flush()
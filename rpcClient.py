@@ -0,0 +1,150 @@
+import json
+import os
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import Web3
+
+from pipelineStats import add_stats_middleware
+from rpcScheduler import RpcScheduler, SchedulingProvider
+
+# ABI files live next to this module, so nothing depends on the current working directory
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'abiContracts')
+
+DEFAULT_TIMEOUT = 30  # seconds per HTTP request
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF_FACTOR = 0.5  # sleeps 0.5s, 1s, 2s, ... between retries
+DEFAULT_POOL_SIZE = 32  # keep-alive connections per host
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+#####################################################
+@lru_cache(maxsize=None)
+def load_abi(file_name):
+    """
+    Load an ABI from the abiContracts directory, once per process.
+    """
+    with open(os.path.join(ABI_DIR, file_name), 'r') as f:
+        return json.load(f)
+
+def default_endpoint_uri():
+    """
+    The JSON-RPC endpoint used when none is configured: ETH_RPC_URL if set, otherwise Infura
+    mainnet with INFURA_API_KEY. The .env file is only read here, on first use.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    endpoint_uri = os.getenv('ETH_RPC_URL')
+    if endpoint_uri:
+        return endpoint_uri
+    return f"https://mainnet.infura.io/v3/{os.getenv('INFURA_API_KEY')}"
+
+def remove_validation_middleware(w3):
+    """
+    Drop web3's transaction validation middleware, which makes two eth_chainId round trips before
+    every eth_call. Only read calls are made here, so there is nothing for it to validate.
+    """
+    try:
+        w3.middleware_onion.remove('validation')
+    except ValueError:
+        pass
+    return w3
+
+#####################################################
+class RpcClient:
+    """
+    Lazily constructed Web3 connection over a pooled keep-alive HTTP session with retry/backoff.
+
+    Nothing is opened until w3 is first used. The connection is rebuilt automatically in a forked
+    child process, so a client can be shared with worker processes safely.
+
+    endpoint_uri may also be a list of endpoints (URIs or RpcScheduler endpoint dicts), in which case
+    requests are load balanced across them with rate limiting, hedging and failover (see rpcScheduler).
+    """
+
+    def __init__(self, endpoint_uri=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, pool_size=DEFAULT_POOL_SIZE, **scheduler_options):
+        self._endpoint_uri = endpoint_uri
+        self.scheduler_options = scheduler_options
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self._w3 = None
+        self._pid = None
+        self._contracts = {}
+
+    @property
+    def endpoint_uri(self):
+        if self._endpoint_uri is None:
+            self._endpoint_uri = default_endpoint_uri()
+        return self._endpoint_uri
+
+    @property
+    def scheduled(self):
+        # Whether requests go through an RpcScheduler over several endpoints
+        return isinstance(self.endpoint_uri, (list, tuple))
+
+    def make_session(self):
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=None,  # JSON-RPC reads are POSTs but safe to repeat
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @property
+    def w3(self):
+        if self._w3 is None or self._pid != os.getpid():
+            if self.scheduled:
+                provider = SchedulingProvider(RpcScheduler(self.endpoint_uri, timeout=self.timeout, **self.scheduler_options))
+            else:
+                provider = Web3.HTTPProvider(self.endpoint_uri, request_kwargs={'timeout': self.timeout}, session=self.make_session())
+            self._w3 = Web3(provider)
+            remove_validation_middleware(self._w3)
+            add_stats_middleware(self._w3)
+            self._pid = os.getpid()
+            self._contracts = {}
+        return self._w3
+
+    def contract(self, address, abi_file_name):
+        """
+        Return a contract object for an address, built once per connection.
+        """
+        w3 = self.w3
+        key = (address, abi_file_name)
+        if key not in self._contracts:
+            self._contracts[key] = w3.eth.contract(address=address, abi=load_abi(abi_file_name))
+        return self._contracts[key]
+
+#####################################################
+_default_client = None
+
+def get_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = RpcClient()
+    return _default_client
+
+def get_w3():
+    return get_client().w3
+
+def configure(endpoint_uri=None, **client_options):
+    """
+    Replace the default client, e.g. configure('http://localhost:8545', retries=10), or
+    configure([{'uri': infura_uri, 'rate': 10}, 'http://localhost:8545']) to spread requests over several endpoints.
+
+    Returns:
+    - RpcClient: The new default client.
+    """
+    global _default_client
+    _default_client = RpcClient(endpoint_uri, **client_options)
+    return _default_client
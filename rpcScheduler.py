@@ -0,0 +1,214 @@
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.base import BaseProvider
+
+DEFAULT_TIMEOUT = 30  # seconds per HTTP request
+DEFAULT_MAX_ATTEMPTS = 4  # endpoints tried per request before giving up
+DEFAULT_COOLDOWN = 1.0  # seconds an endpoint is benched after its first failure, doubled on each further one
+MAX_COOLDOWN = 60.0
+INITIAL_LATENCY = 0.2  # seconds, latency assumed for an endpoint before it has answered anything
+LATENCY_SMOOTHING = 0.2  # weight of the newest sample in the latency moving average
+HEDGE_LATENCY_MULTIPLIER = 3.0  # adaptive hedge delay, as a multiple of the endpoint's average latency
+MIN_HEDGE_DELAY = 0.05
+
+# JSON-RPC error codes providers use for rate limiting / temporary unavailability
+RETRYABLE_RPC_ERROR_CODES = {-32005, -32603, 429}
+RETRYABLE_HTTP_STATUS_CODES = {429, 500, 502, 503, 504}
+
+#####################################################
+class RetryableRpcError(Exception):
+    pass
+
+#####################################################
+class TokenBucket:
+    """
+    Classic token bucket: rate tokens per second, holding at most burst tokens.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait_time(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+#####################################################
+class Endpoint:
+    def __init__(self, uri, rate=None, burst=None, pool_size=32):
+        self.uri = uri
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.latency = INITIAL_LATENCY
+        self.failures = 0
+        self.benched_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def is_available(self, now):
+        return now >= self.benched_until
+
+    def record_success(self, latency):
+        self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+        self.failures = 0
+
+    def record_failure(self, now):
+        self.errors += 1
+        self.failures += 1
+        self.benched_until = now + min(MAX_COOLDOWN, DEFAULT_COOLDOWN * 2 ** (self.failures - 1))
+
+#####################################################
+class RpcScheduler:
+    """
+    Spread JSON-RPC requests over several endpoints.
+
+    - Each endpoint has an optional token bucket (requests/second), so no provider is pushed past its limit.
+    - Among endpoints with spare capacity, one is picked at random weighted by 1 / average latency.
+    - A request that is slower than hedge_after (by default a multiple of the endpoint's average latency)
+      is sent to a second endpoint as well, and the first answer wins.
+    - Endpoints that time out, return 429/5xx or a rate-limit RPC error are benched with exponential
+      cooldown, and the request fails over to another endpoint.
+
+    Parameters:
+    - endpoints (list): Endpoint URIs, or dicts {'uri': ..., 'rate': requests per second, 'burst': ...}.
+    - timeout (float): Seconds per HTTP request.
+    - max_attempts (int): Endpoints tried per request before the last error is raised.
+    - hedge (bool): Whether to send hedged duplicates of slow requests.
+    - hedge_after (float): Fixed hedge delay in seconds; adaptive when None.
+    """
+
+    def __init__(self, endpoints, timeout=DEFAULT_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS, hedge=True, hedge_after=None):
+        if not endpoints:
+            raise ValueError("RpcScheduler needs at least one endpoint.")
+        self.endpoints = [
+            Endpoint(endpoint) if isinstance(endpoint, str) else Endpoint(endpoint['uri'], endpoint.get('rate'), endpoint.get('burst'))
+            for endpoint in endpoints
+        ]
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.hedge = hedge and len(self.endpoints) > 1
+        self.hedge_after = hedge_after
+        self.request_ids = itertools.count()
+        self.executor = ThreadPoolExecutor(max_workers=8 * len(self.endpoints))
+
+    def choose(self, exclude=()):
+        """
+        Pick the endpoint for the next request, waiting for a rate-limit token if every endpoint is busy.
+        """
+        while True:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude and endpoint.is_available(now)]
+            if not candidates:
+                # Everything is benched or already tried: retry the endpoint that recovers first
+                remaining = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or self.endpoints
+                candidates = [min(remaining, key=lambda endpoint: endpoint.benched_until)]
+
+            # Weighted shuffle by 1 / latency: faster endpoints are tried first more often
+            ordered = sorted(candidates, key=lambda endpoint: random.random() ** max(endpoint.latency, 1e-3), reverse=True)
+
+            for endpoint in ordered:
+                if endpoint.bucket is None or endpoint.bucket.try_acquire():
+                    return endpoint
+
+            time.sleep(min(endpoint.bucket.wait_time() for endpoint in ordered if endpoint.bucket))
+
+    def send(self, endpoint, payload):
+        start = time.monotonic()
+        endpoint.requests += 1
+        try:
+            response = endpoint.session.post(endpoint.uri, json=payload, timeout=self.timeout)
+            if response.status_code in RETRYABLE_HTTP_STATUS_CODES:
+                raise RetryableRpcError(f"{endpoint.uri} returned HTTP {response.status_code}")
+            response.raise_for_status()
+            result = response.json()
+            error = result.get('error') if isinstance(result, dict) else None
+            if error and (error.get('code') in RETRYABLE_RPC_ERROR_CODES or 'rate' in str(error.get('message', '')).lower()):
+                raise RetryableRpcError(f"{endpoint.uri} returned {error}")
+        except (requests.RequestException, ValueError, RetryableRpcError):
+            endpoint.record_failure(time.monotonic())
+            raise
+
+        endpoint.record_success(time.monotonic() - start)
+        return result
+
+    def request(self, method, params):
+        """
+        Send one JSON-RPC request, with rate limiting, hedging and failover.
+
+        Returns:
+        - dict: The JSON-RPC response.
+        """
+        payload = {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': next(self.request_ids)}
+        tried = []
+        last_error = None
+
+        while len(tried) < self.max_attempts:
+            endpoint = self.choose(exclude=tried)
+            tried.append(endpoint)
+            pending = {self.executor.submit(self.send, endpoint, payload)}
+
+            if self.hedge and len(tried) < len(self.endpoints):
+                hedge_after = self.hedge_after if self.hedge_after is not None else max(MIN_HEDGE_DELAY, HEDGE_LATENCY_MULTIPLIER * endpoint.latency)
+                done, _ = wait(pending, timeout=hedge_after)
+                if not done:
+                    hedge_endpoint = self.choose(exclude=tried)
+                    tried.append(hedge_endpoint)
+                    pending.add(self.executor.submit(self.send, hedge_endpoint, payload))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        return future.result()
+                    except Exception as error:
+                        last_error = error
+
+        raise last_error
+
+    def stats(self):
+        return [
+            {'uri': endpoint.uri, 'requests': endpoint.requests, 'errors': endpoint.errors,
+             'latency': endpoint.latency, 'benched': not endpoint.is_available(time.monotonic())}
+            for endpoint in self.endpoints
+        ]
+
+#####################################################
+class SchedulingProvider(BaseProvider):
+    """
+    Web3 provider sending every request through an RpcScheduler.
+    """
+
+    def __init__(self, scheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    def make_request(self, method, params):
+        return self.scheduler.request(method, params)
+
+    def is_connected(self, show_traceback=False):
+        return True
@@ -0,0 +1,145 @@
+import sqlite3
+
+from pipelineStats import stats
+
+# Default location of the on-disk pool state cache
+DEFAULT_CACHE_PATH = 'poolStateCache.sqlite'
+# Number of blocks fetched and committed at a time, so an interrupted backfill loses at most this much work
+CACHE_FLUSH_BLOCKS = 1000
+
+# Columns holding one pool state of each kind; uint112/uint160 values do not fit SQLite integers and are stored as text
+STATE_COLUMNS = {
+    'v2_reserves': ['reserve0', 'reserve1', 'block_timestamp_last'],
+    'v3_slot0': ['sqrt_price_x96', 'tick', 'observation_index', 'observation_cardinality',
+                 'observation_cardinality_next', 'fee_protocol', 'unlocked'],
+}
+BIG_INT_COLUMNS = {'reserve0', 'reserve1', 'sqrt_price_x96'}
+
+#####################################################
+class StateCache:
+    """
+    SQLite cache of historical pool state keyed by (pool address, block number).
+
+    Historical state never changes, so anything read once from a node can be served from here afterwards.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        # Generous lock timeout, since batch workers in several processes may share one cache file
+        self.connection = sqlite3.connect(path, timeout=60)
+        for kind, columns in STATE_COLUMNS.items():
+            column_definitions = ', '.join(f'{column} {"TEXT" if column in BIG_INT_COLUMNS else "INTEGER"}' for column in columns)
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {kind} (pool TEXT NOT NULL, block INTEGER NOT NULL, {column_definitions}, '
+                f'PRIMARY KEY (pool, block)) WITHOUT ROWID')
+        self.connection.commit()
+
+    def get(self, kind, pool_addresses, start_block, end_block):
+        """
+        Read cached states of several pools over a block range.
+
+        Returns:
+        - dict: block_number -> list of states, one per pool, for the blocks where every pool is cached.
+        """
+        pools = [pool_address.lower() for pool_address in pool_addresses]
+        unique_pools = sorted(set(pools))
+        columns = STATE_COLUMNS[kind]
+        placeholders = ', '.join('?' * len(unique_pools))
+        rows = self.connection.execute(
+            f'SELECT pool, block, {", ".join(columns)} FROM {kind} '
+            f'WHERE pool IN ({placeholders}) AND block BETWEEN ? AND ?',
+            unique_pools + [start_block, end_block])
+
+        states = {}
+        for row in rows:
+            states.setdefault(row[1], {})[row[0]] = _decode_state(columns, row[2:])
+
+        return {
+            block_number: [pool_states[pool] for pool in pools]
+            for block_number, pool_states in sorted(states.items())
+            if len(pool_states) == len(unique_pools)
+        }
+
+    def put(self, kind, pool_addresses, states_by_block):
+        """
+        Store the states of several pools, as returned by get() or by the fetch_*_range functions.
+        """
+        pools = [pool_address.lower() for pool_address in pool_addresses]
+        columns = STATE_COLUMNS[kind]
+        placeholders = ', '.join('?' * (len(columns) + 2))
+        rows = (
+            [pool, block_number] + _encode_state(columns, state)
+            for block_number, states in states_by_block.items()
+            for pool, state in zip(pools, states)
+        )
+        with self.connection:
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO {kind} (pool, block, {", ".join(columns)}) VALUES ({placeholders})', rows)
+
+    def delete_after(self, block_number):
+        """
+        Drop every cached state after block_number, e.g. the orphaned blocks of a chain reorg.
+        """
+        with self.connection:
+            for kind in STATE_COLUMNS:
+                self.connection.execute(f'DELETE FROM {kind} WHERE block > ?', (block_number,))
+
+    def close(self):
+        self.connection.close()
+
+#####################################################
+def _encode_state(columns, state):
+    return [str(value) if column in BIG_INT_COLUMNS and value is not None else value for column, value in zip(columns, state)]
+
+def _decode_state(columns, row):
+    return tuple(int(value) if column in BIG_INT_COLUMNS and value is not None else value for column, value in zip(columns, row))
+
+#####################################################
+def missing_ranges(cached_blocks, start_block, end_block, max_length=CACHE_FLUSH_BLOCKS):
+    """
+    List the contiguous runs of blocks in [start_block, end_block] that are not in cached_blocks.
+
+    Runs longer than max_length are split, so each one can be fetched and committed on its own.
+
+    Returns:
+    - list: (run_start, run_end) tuples, both inclusive, in block order.
+    """
+    ranges = []
+    run_start = None
+    for block_number in range(start_block, end_block + 2):
+        is_missing = block_number <= end_block and block_number not in cached_blocks
+        if is_missing and run_start is None:
+            run_start = block_number
+        if run_start is not None and (not is_missing or block_number - run_start + 1 > max_length):
+            run_end = block_number - 1
+            ranges.append((run_start, run_end))
+            run_start = block_number if is_missing else None
+
+    return ranges
+
+def cached_fetch_range(cache, kind, fetch_range, pool_addresses, start_block, end_block, flush_blocks=CACHE_FLUSH_BLOCKS):
+    """
+    Serve a block range from the cache, fetching and storing only the blocks it does not hold yet.
+
+    Missing blocks are fetched flush_blocks at a time and committed after every run, so rerunning an
+    interrupted backfill resumes where it stopped.
+
+    Parameters:
+    - cache (StateCache): The cache to read from and write to.
+    - kind (str): 'v2_reserves' or 'v3_slot0'.
+    - fetch_range (function): Called as fetch_range(pool_addresses, run_start, run_end), returns block -> states.
+    - pool_addresses (list): The pool addresses.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+
+    Returns:
+    - dict: block_number -> list of states, one per pool, for every block of the range.
+    """
+    states_by_block = cache.get(kind, pool_addresses, start_block, end_block)
+    stats.record_cache(kind, len(states_by_block), end_block - start_block + 1 - len(states_by_block))
+    for run_start, run_end in missing_ranges(states_by_block, start_block, end_block, flush_blocks):
+        fetched = fetch_range(pool_addresses, run_start, run_end)
+        cache.put(kind, pool_addresses, fetched)
+        states_by_block.update(fetched)
+
+    return dict(sorted(states_by_block.items()))
@@ -0,0 +1,176 @@
+import time
+
+import numpy as np
+
+from pipelineStats import stats, timed
+
+# Storage slots of the packed pool state read by getReserves() / slot0()
+V2_RESERVES_SLOT = 8  # UniswapV2Pair: reserve0 (uint112) | reserve1 (uint112) | blockTimestampLast (uint32), low bits first
+V3_SLOT0_SLOT = 0  # UniswapV3Pool: sqrtPriceX96 (uint160) | tick (int24) | observationIndex, observationCardinality,
+                   # observationCardinalityNext (uint16) | feeProtocol (uint8) | unlocked (bool), low bits first
+# eth_getStorageAt requests sent per JSON-RPC batch
+STORAGE_BATCH_SIZE = 1000
+# Blocks read and decoded at a time by the *_range and *_arrays functions
+STORAGE_WINDOW_BLOCKS = 1000
+
+MASK_112 = (1 << 112) - 1
+MASK_160 = (1 << 160) - 1
+TWO_64 = 2.0 ** 64
+
+#####################################################
+def fetch_storage_words(w3, addresses, slot, block_numbers, batch_size=STORAGE_BATCH_SIZE):
+    """
+    Read one storage slot of several contracts at several blocks with batched eth_getStorageAt.
+
+    The requests go straight to the provider, without web3's request formatters or any contract object.
+    Providers without JSON-RPC batching (e.g. the multi-endpoint SchedulingProvider) get one request per read.
+
+    Parameters:
+    - w3 (Web3): The Web3 instance whose provider is used.
+    - addresses (list): The contract addresses.
+    - slot (int): The storage slot.
+    - block_numbers (list): The blocks at which to read the slot.
+    - batch_size (int): The number of eth_getStorageAt requests per HTTP request.
+
+    Returns:
+    - ndarray: uint8 array of shape (blocks, addresses, 32), each row a big-endian storage word.
+    """
+    block_numbers = list(block_numbers)
+    requests = [('eth_getStorageAt', [address, hex(slot), hex(block_number)]) for block_number in block_numbers for address in addresses]
+    make_batch_request = getattr(w3.provider, 'make_batch_request', None)
+
+    words = []
+    for offset in range(0, len(requests), batch_size):
+        chunk = requests[offset:offset + batch_size]
+        started = time.perf_counter()
+        if make_batch_request is not None:
+            responses = make_batch_request(chunk)
+            if not isinstance(responses, list):
+                raise ValueError(f"eth_getStorageAt batch failed: {responses.get('error')}")
+        else:
+            responses = [w3.provider.make_request(method, params) for method, params in chunk]
+        elapsed = (time.perf_counter() - started) / len(chunk)
+        for (_, params), response in zip(chunk, responses):
+            stats.record_rpc('eth_getStorageAt', elapsed, 'error' not in response)
+            if 'error' in response:
+                raise ValueError(f"eth_getStorageAt {params} failed: {response['error']}")
+            words.append(response['result'][2:].rjust(64, '0'))
+
+    return np.frombuffer(bytes.fromhex(''.join(words)), dtype=np.uint8).reshape(len(block_numbers), len(addresses), 32)
+
+def _limbs(words):
+    # Split 32-byte big-endian words into four native uint64 limbs, most significant first
+    limbs = np.ascontiguousarray(words).view('>u8').astype(np.uint64)
+    return limbs[..., 0], limbs[..., 1], limbs[..., 2], limbs[..., 3]
+
+#####################################################
+def decode_v2_reserves_words(words):
+    """
+    Decode packed UniswapV2Pair reserve slots with integer bit operations on whole arrays.
+
+    Returns:
+    - dict: reserve0 and reserve1 (float64, the precision prices are computed in) and block_timestamp_last (uint32),
+      each with the shape of words without its last axis.
+    """
+    bits_192, bits_128, bits_64, bits_0 = _limbs(words)
+    reserve0 = bits_0.astype(np.float64) + (bits_64 & np.uint64(0xFFFFFFFFFFFF)).astype(np.float64) * TWO_64
+    reserve1 = ((bits_64 >> np.uint64(48)).astype(np.float64) + bits_128.astype(np.float64) * 2.0 ** 16
+                + (bits_192 & np.uint64(0xFFFFFFFF)).astype(np.float64) * 2.0 ** 80)
+    return {
+        'reserve0': reserve0,
+        'reserve1': reserve1,
+        'block_timestamp_last': (bits_192 >> np.uint64(32)).astype(np.uint32),
+    }
+
+def decode_v3_slot0_words(words):
+    """
+    Decode packed UniswapV3Pool slot0 slots with integer bit operations on whole arrays.
+
+    Returns:
+    - dict: sqrt_price_x96 (float64), tick (int32), observation_index, observation_cardinality,
+      observation_cardinality_next (uint16), fee_protocol (uint8) and unlocked (bool) arrays.
+    """
+    bits_192, bits_128, bits_64, bits_0 = _limbs(words)
+    sqrt_price_x96 = (bits_0.astype(np.float64) + bits_64.astype(np.float64) * TWO_64
+                      + (bits_128 & np.uint64(0xFFFFFFFF)).astype(np.float64) * 2.0 ** 128)
+    # int24 at bits 160-183, sign-extended
+    tick = ((bits_128 >> np.uint64(32)) & np.uint64(0xFFFFFF)).astype(np.int32)
+    tick -= (tick >= 1 << 23).astype(np.int32) << 24
+    return {
+        'sqrt_price_x96': sqrt_price_x96,
+        'tick': tick,
+        'observation_index': ((bits_128 >> np.uint64(56)) | ((bits_192 & np.uint64(0xFF)) << np.uint64(8))).astype(np.uint16),
+        'observation_cardinality': ((bits_192 >> np.uint64(8)) & np.uint64(0xFFFF)).astype(np.uint16),
+        'observation_cardinality_next': ((bits_192 >> np.uint64(24)) & np.uint64(0xFFFF)).astype(np.uint16),
+        'fee_protocol': ((bits_192 >> np.uint64(40)) & np.uint64(0xFF)).astype(np.uint8),
+        'unlocked': ((bits_192 >> np.uint64(48)) & np.uint64(0xFF)) != 0,
+    }
+
+#####################################################
+def _fetch_word_arrays(w3, addresses, slot, start_block, end_block, decoder):
+    # Read and decode STORAGE_WINDOW_BLOCKS blocks at a time into arrays preallocated for the whole range
+    arrays = {}
+    for window_start in range(start_block, end_block + 1, STORAGE_WINDOW_BLOCKS):
+        window_end = min(window_start + STORAGE_WINDOW_BLOCKS - 1, end_block)
+        decoded = decoder(fetch_storage_words(w3, addresses, slot, range(window_start, window_end + 1)))
+        for name, values in decoded.items():
+            if name not in arrays:
+                arrays[name] = np.empty((end_block - start_block + 1, len(addresses)), dtype=values.dtype)
+            arrays[name][window_start - start_block:window_end - start_block + 1] = values
+    return arrays
+
+@timed('fetch')
+def fetch_v2_reserves_arrays(w3, pair_addresses, start_block, end_block):
+    """
+    Read the reserves of several Uniswap V2 pairs over a block range straight into arrays.
+
+    Returns:
+    - dict: The arrays of decode_v2_reserves_words, of shape (blocks, pairs), row i holding start_block + i.
+    """
+    return _fetch_word_arrays(w3, pair_addresses, V2_RESERVES_SLOT, start_block, end_block, decode_v2_reserves_words)
+
+@timed('fetch')
+def fetch_v3_slot0_arrays(w3, pool_addresses, start_block, end_block):
+    """
+    Read slot0 of several Uniswap V3 pools over a block range straight into arrays.
+
+    Returns:
+    - dict: The arrays of decode_v3_slot0_words, of shape (blocks, pools), row i holding start_block + i.
+    """
+    return _fetch_word_arrays(w3, pool_addresses, V3_SLOT0_SLOT, start_block, end_block, decode_v3_slot0_words)
+
+#####################################################
+def _fetch_word_range(w3, addresses, slot, start_block, end_block, decoder):
+    states_by_block = {}
+    for window_start in range(start_block, end_block + 1, STORAGE_WINDOW_BLOCKS):
+        window_end = min(window_start + STORAGE_WINDOW_BLOCKS - 1, end_block)
+        words = fetch_storage_words(w3, addresses, slot, range(window_start, window_end + 1))
+        for block_number, block_words in zip(range(window_start, window_end + 1), words):
+            states_by_block[block_number] = [decoder(int.from_bytes(word.tobytes(), 'big')) for word in block_words]
+    return states_by_block
+
+def _unpack_reserves(word):
+    return word & MASK_112, (word >> 112) & MASK_112, word >> 224
+
+def _unpack_slot0(word):
+    tick = (word >> 160) & 0xFFFFFF
+    return (word & MASK_160, tick - (1 << 24) if tick >= 1 << 23 else tick, (word >> 184) & 0xFFFF, (word >> 200) & 0xFFFF,
+            (word >> 216) & 0xFFFF, (word >> 232) & 0xFF, bool((word >> 240) & 0xFF))
+
+def fetch_v2_reserves_storage_range(w3, pair_addresses, start_block, end_block):
+    """
+    Same as reading getReserves() of several pairs at every block of a range, from the raw reserve slot.
+
+    Returns:
+    - dict: block_number -> list of (reserve0, reserve1, blockTimestampLast), one per pair, as exact integers.
+    """
+    return _fetch_word_range(w3, pair_addresses, V2_RESERVES_SLOT, start_block, end_block, _unpack_reserves)
+
+def fetch_v3_slot0_storage_range(w3, pool_addresses, start_block, end_block):
+    """
+    Same as reading slot0() of several pools at every block of a range, from the raw slot0 slot.
+
+    Returns:
+    - dict: block_number -> list of slot0 tuples, one per pool, as exact integers.
+    """
+    return _fetch_word_range(w3, pool_addresses, V3_SLOT0_SLOT, start_block, end_block, _unpack_slot0)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rpcClient
+import tokenPriceUniV2 as uni_v2
+from mockNode import MockChain
+from tokenRegistry import PoolRegistry
+
+#####################################################
+@pytest.fixture
+def chain():
+    return MockChain(head_block=18000000)
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(uni_v2, 'registry', PoolRegistry(path=None))
+    yield uni_v2.registry
+    rpcClient.configure()
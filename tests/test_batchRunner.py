@@ -0,0 +1,27 @@
+from batchRunner import plan_shards
+
+#####################################################
+def test_shards_only_cover_the_blocks_of_their_jobs():
+    stable = [('v2', 'USDC_ETH')]
+    jobs = [
+        {'label': 'A', 'route': [('v2', 'A_ETH')] + stable, 'start_block': 0, 'end_block': 5},
+        {'label': 'B', 'route': [('v2', 'B_ETH')] + stable, 'start_block': 0, 'end_block': 9999},
+        {'label': 'C', 'route': [('v2', 'C_ETH')] + stable, 'start_block': 7000, 'end_block': 12000},
+    ]
+
+    shards = [(shard_start, shard_end, sorted(routes)) for shard_start, shard_end, routes in plan_shards(jobs, shard_blocks=10000)]
+    assert shards == [
+        (0, 5, ['A', 'B']),
+        (6, 6999, ['B']),
+        (7000, 9999, ['B', 'C']),
+        (10000, 12000, ['C']),
+    ]
+
+def test_shards_skip_blocks_without_jobs():
+    route = [('v2', 'USDC_ETH')]
+    jobs = [
+        {'label': 'A', 'route': route, 'start_block': 100, 'end_block': 149},
+        {'label': 'B', 'route': route, 'start_block': 300, 'end_block': 349},
+    ]
+
+    assert [shard[:2] for shard in plan_shards(jobs, shard_blocks=100)] == [(100, 149), (300, 349)]
@@ -0,0 +1,26 @@
+from functools import partial
+
+import pandas as pd
+
+import rpcClient
+from headFollower import follow_head
+from mockNode import MockNode
+from priceRouter import price_routes
+
+#####################################################
+def test_follow_head_with_price_routes(chain, registry):
+    # The synthetic V2 pairs chain token i / token i+1, so the last token of the chain plays the stablecoin
+    pair_addresses = chain.pool_addresses('v2')
+    usd_token = chain.pools[pair_addresses[-1].lower()]['token1']
+    routes = {'TOKEN1': [('v2', address) for address in pair_addresses[1:]], 'TOKEN2': [('v2', pair_addresses[-1])]}
+    start_block, end_block = chain.head_block - 24, chain.head_block
+
+    with MockNode(chain) as node:
+        rpcClient.configure(node.url)
+        expected = price_routes(routes, start_block, end_block, usd_tokens={usd_token})
+        updates = list(follow_head(partial(price_routes, routes, usd_tokens={usd_token}), start_block=start_block, end_block=end_block,
+                                   poll_interval=0, max_blocks_per_update=10))
+
+    assert [rollback_block for rollback_block, _ in updates] == [None] * 3
+    assert [len(df) for _, df in updates] == [10, 10, 5]
+    pd.testing.assert_frame_equal(pd.concat(df for _, df in updates), expected)
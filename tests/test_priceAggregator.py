@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from priceAggregator import PriceAggregator
+
+#####################################################
+def price_frame(start_block, end_block):
+    blocks = np.arange(start_block, end_block + 1)
+    return pd.DataFrame({'coin0_price_in_usd': 1000.0 + np.sin(blocks / 7.0) * 50}, index=pd.Index(blocks, name='block_number'))
+
+#####################################################
+def test_bars_are_float_without_volume():
+    aggregator = PriceAggregator(path=None, bucket_size=10)
+    aggregator.update(price_frame(0, 35))
+    bars = aggregator.bars('coin0_price_in_usd', include_open=True)
+
+    assert (bars.drop(columns='observations').dtypes == np.float64).all()
+    assert bars['vwap'].isna().all()
+    assert bars['observations'].tolist() == [10, 10, 10, 6]
+
+def test_rolling_window_saved_incrementally(tmp_path):
+    path = str(tmp_path / 'aggregates.sqlite')
+    expected = PriceAggregator(path=None, bucket_size=10, rolling_size=25)
+    expected.update(price_frame(0, 200))
+
+    # One block per update, reopening the aggregator every 20 blocks
+    aggregator = PriceAggregator(path=path, bucket_size=10, rolling_size=25)
+    for block_number in range(0, 201):
+        if block_number % 20 == 0:
+            aggregator.close()
+            aggregator = PriceAggregator(path=path, bucket_size=10, rolling_size=25)
+        aggregator.update(price_frame(block_number, block_number))
+        saved_segments = aggregator.connection.execute('SELECT COUNT(*) FROM rolling_segments').fetchone()[0]
+        assert saved_segments == len(aggregator.series['coin0_price_in_usd'].segments) <= 26
+
+    pd.testing.assert_frame_equal(aggregator.bars('coin0_price_in_usd', include_open=True),
+                                  expected.bars('coin0_price_in_usd', include_open=True))
+    aggregator.close()
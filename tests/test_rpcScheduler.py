@@ -0,0 +1,56 @@
+import socket
+import time
+
+import rpcClient
+import tokenPriceUniV2 as uni_v2
+from mockNode import MockNode
+from rpcScheduler import RpcScheduler
+
+#####################################################
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+#####################################################
+def test_concurrent_fetch_respects_endpoint_rate_limits(chain, registry):
+    pair_addresses = chain.pool_addresses('v2')
+    start_block, end_block = chain.head_block - 20, chain.head_block
+
+    with MockNode(chain) as reference:
+        rpcClient.configure(reference.url)
+        expected = uni_v2.create_price_dataframe_v2(start_block, end_block, *pair_addresses, file_name=None)
+
+    with MockNode(chain) as fast, MockNode(chain, rate_limit=3) as limited:
+        rpcClient.configure([fast.url, {'uri': limited.url, 'rate': 3}])
+        df = uni_v2.create_price_dataframe_v2(start_block, end_block, *pair_addresses, file_name=None, max_concurrency=8)
+        assert limited.stats()['rate_limited'] == 0
+        assert limited.stats()['http_requests'] > 0
+
+    assert df.equals(expected)
+
+def test_failover_to_healthy_endpoint(chain):
+    with MockNode(chain) as node:
+        scheduler = RpcScheduler([closed_port_url(), node.url], timeout=2, hedge=False)
+        # Make the dead endpoint the first choice, so every request has to fail over
+        scheduler.endpoints[1].latency = 100.0
+        for _ in range(5):
+            assert int(scheduler.request('eth_blockNumber', [])['result'], 16) == chain.head_block
+
+        dead, healthy = scheduler.stats()
+        assert healthy['requests'] == 5
+        assert dead['errors'] >= 1 and dead['benched']
+
+def test_hedged_request_answered_by_fast_endpoint(chain):
+    with MockNode(chain, latency=2.0) as slow, MockNode(chain) as fast:
+        scheduler = RpcScheduler([slow.url, fast.url], hedge_after=0.05)
+        # Make the slow endpoint the first choice, so only the hedge can answer quickly
+        scheduler.endpoints[1].latency = 100.0
+
+        started = time.perf_counter()
+        response = scheduler.request('eth_blockNumber', [])
+        assert time.perf_counter() - started < 1.0
+        assert int(response['result'], 16) == chain.head_block
+        assert scheduler.endpoints[0].requests == 1
+        assert fast.stats()['http_requests'] == 1
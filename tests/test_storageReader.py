@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+import rpcClient
+import tokenPriceUniV2 as uni_v2
+from mockNode import MockNode
+from storageReader import decode_v2_reserves_words, decode_v3_slot0_words
+
+#####################################################
+def packed_words(*values):
+    # Big-endian 32-byte storage words as fetch_storage_words returns them, one row per block and one column per value
+    return np.frombuffer(b''.join(value.to_bytes(32, 'big') for value in values), dtype=np.uint8).reshape(len(values), 1, 32)
+
+#####################################################
+def test_decode_v2_reserves_words():
+    reserves = [(123456789 * 10 ** 18, 987654321 * 10 ** 6, 1700000000), ((1 << 112) - 1, 1, 0), (0, (1 << 112) - 1, (1 << 32) - 1)]
+    decoded = decode_v2_reserves_words(packed_words(*(reserve0 | reserve1 << 112 | timestamp << 224 for reserve0, reserve1, timestamp in reserves)))
+
+    assert decoded['reserve0'].shape == (3, 1)
+    assert decoded['reserve0'][:, 0].tolist() == [float(reserve0) for reserve0, _, _ in reserves]
+    assert decoded['reserve1'][:, 0].tolist() == [float(reserve1) for _, reserve1, _ in reserves]
+    assert decoded['block_timestamp_last'][:, 0].tolist() == [timestamp for _, _, timestamp in reserves]
+
+def test_decode_v3_slot0_words():
+    # (sqrtPriceX96, tick, observationIndex, observationCardinality, observationCardinalityNext, feeProtocol, unlocked)
+    slots = [
+        (1461446703485210103287273052203988822378723970341, -887272, 65535, 1, 2, 0x44, True),
+        (79228162514264337593543950336, 0, 0, 1, 1, 0, False),
+        (4295128739, 887272, 513, 1000, 65535, 0xFF, True),
+        (2 ** 96 + 12345, -1, 7, 8, 9, 0, True),
+    ]
+    words = [
+        sqrt_price_x96 | (tick % (1 << 24)) << 160 | index << 184 | cardinality << 200 | cardinality_next << 216 | fee_protocol << 232 | int(unlocked) << 240
+        for sqrt_price_x96, tick, index, cardinality, cardinality_next, fee_protocol, unlocked in slots
+    ]
+    decoded = decode_v3_slot0_words(packed_words(*words))
+
+    assert decoded['tick'][:, 0].tolist() == [-887272, 0, 887272, -1]
+    assert decoded['sqrt_price_x96'][:, 0].tolist() == [float(slot[0]) for slot in slots]
+    assert decoded['observation_index'][:, 0].tolist() == [65535, 0, 513, 7]
+    assert decoded['observation_cardinality'][:, 0].tolist() == [1, 1, 1000, 8]
+    assert decoded['observation_cardinality_next'][:, 0].tolist() == [2, 1, 65535, 9]
+    assert decoded['fee_protocol'][:, 0].tolist() == [0x44, 0, 0xFF, 0]
+    assert decoded['unlocked'][:, 0].tolist() == [True, False, True, True]
+
+def test_storage_pipeline_matches_contract_calls(chain, registry):
+    pair_addresses = chain.pool_addresses('v2')
+    start_block, end_block = chain.head_block - 30, chain.head_block
+
+    with MockNode(chain) as node:
+        rpcClient.configure(node.url)
+        expected = uni_v2.create_price_dataframe_v2(start_block, end_block, *pair_addresses, file_name=None)
+        node.reset_stats()
+        df = uni_v2.create_price_dataframe_v2(start_block, end_block, *pair_addresses, file_name=None, use_storage=True)
+        assert set(node.stats()['calls_by_method']) == {'eth_getStorageAt'}
+
+    pd.testing.assert_frame_equal(df, expected)
@@ -1,25 +1,22 @@
-from web3 import Web3
-import json
 import numpy as np
-import pandas as pd
-import os
-from dotenv import load_dotenv
+from multicallBatch import fetch_v2_reserves
+from storageReader import fetch_v2_reserves_storage_range, fetch_v2_reserves_arrays
+from asyncBlockFetcher import fetch_v2_reserves_range, fetch_range_threaded
+from logBackfill import get_logs_chunked, forward_fill, DEFAULT_LOG_CHUNK_SIZE
+from stateCache import cached_fetch_range
+from tokenRegistry import PoolRegistry
+from priceFrame import build_price_dataframe, reciprocal
+from rpcClient import get_client, get_w3
+from pipelineStats import timed
 
-# Load the .env file
-load_dotenv()
+# The Web3 connection (Infura by default, see rpcClient.configure) is only opened on first use,
+# so importing this module does no I/O
 
-# Access the INFURA_API_KEY environment variable
-INFURA_API_KEY = os.getenv('INFURA_API_KEY')
+# Token addresses and decimals of every pool seen so far, persisted between runs
+registry = PoolRegistry()
 
-w3 = Web3(Web3.HTTPProvider(f'https://mainnet.infura.io/v3/{INFURA_API_KEY}'))
-
-# Load Uniswap V3 Pool ABI
-with open('abiContracts/erc20_abi.json', 'r') as f:
-    erc20_abi = json.load(f)
-
-# Load Uniswap V2 Pair ABI
-with open('abiContracts/uniswap_v2_pool_abi.json', 'r') as f:
-    uniswap_v2_pair_abi = json.load(f)
+# Uniswap V2 Pair ABI
+UNISWAP_V2_PAIR_ABI = 'uniswap_v2_pool_abi.json'
 
 
 #####################################################
@@ -30,21 +27,23 @@ stable_pair1_address = 0xb4e16d0168e52d35cacd2c6185b44281ec28c9dc # USDC/ETH
 stable_pair0_address = 0xe93dc496dbc669d7ee4f03b0eb0a10bb13a4b2a4 # USDC/DUCK
 target_pair_address_stable = 0xb4e16d0168e52d35cacd2c6185b44281ec28c9dc # USDC/ETH
 
+# keccak256('Sync(uint112,uint112)'), emitted by a pair every time its reserves change
+SYNC_TOPIC = '0x1c411e9a96e071241c2f21f7726b17ae89e3cab4c78be50e062b03a9fffbbad1'
+
 #####################################################
 def get_decimals(token_address):
-    token_contract = w3.eth.contract(address=token_address, abi=erc20_abi)
-    return token_contract.functions.decimals().call()
+    return registry.get_token_decimals([token_address])[0]
 
 ############################################################
-def get_token_addresses_v2(pair_address):
-    # Create a contract instance
-    pair_contract = w3.eth.contract(address=pair_address, abi=uniswap_v2_pair_abi)
-
-    # Call the token0 and token1 functions
-    token0_address = pair_contract.functions.token0().call()
-    token1_address = pair_contract.functions.token1().call()
+def get_pair_contract(pair_address):
+    # Contract objects are built once per connection by the client
+    return get_client().contract(pair_address, UNISWAP_V2_PAIR_ABI)
 
-    return token0_address, token1_address
+############################################################
+def get_token_addresses_v2(pair_address):
+    # token0/token1 never change, so they are resolved once and kept in the registry
+    pool = registry.get_pool(pair_address)
+    return pool['token0'], pool['token1']
 
 
 ############################################################
@@ -62,12 +61,30 @@ def get_v2_price(token0_address, token1_address, pair_address, block_number, tok
     Returns:
     - float: The price of the specified token.
     """
-    pair_contract = w3.eth.contract(address=pair_address, abi=uniswap_v2_pair_abi)
+    pair_contract = get_pair_contract(pair_address)
     reserves = pair_contract.functions.getReserves().call(block_identifier=block_number)
 
     token0_decimals = get_decimals(token0_address)
     token1_decimals = get_decimals(token1_address)
 
+    return reserves_to_price(reserves, token0_decimals, token1_decimals, token_to_price)
+
+############################################################
+@timed('compute')
+def reserves_to_price(reserves, token0_decimals, token1_decimals, token_to_price):
+    """
+    Convert raw getReserves() output into the price of one token of the pair.
+
+    Parameters:
+    - reserves (tuple): The (reserve0, reserve1, blockTimestampLast) tuple returned by getReserves(),
+      or a (reserve0, reserve1) tuple of NumPy arrays to price many blocks at once.
+    - token0_decimals (int): The decimals of token0.
+    - token1_decimals (int): The decimals of token1.
+    - token_to_price (str): Specify which token's price to get ('token0' or 'token1').
+
+    Returns:
+    - float or ndarray: The price of the specified token.
+    """
     reserve0 = reserves[0] / (10 ** token0_decimals)
     reserve1 = reserves[1] / (10 ** token1_decimals)
 
@@ -79,179 +96,224 @@ def get_v2_price(token0_address, token1_address, pair_address, block_number, tok
         raise ValueError("Invalid token_to_price argument. Must be 'token0' or 'token1'.")
 
 ############################################################
-def create_price_dataframe_v2(start_block, end_block, target_pair_address, stable_pair0_address, stable_pair1_address, file_name='your_file.csv'):
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    # Get the token addresses for each pair
-    target_token0_address, target_token1_address = get_token_addresses_v2(target_pair_address) # WBTC/ETH
-    stable0_token0_address, stable0_token1_address = get_token_addresses_v2(stable_pair0_address) # USDC/WBTC
-    stable1_token0_address, stable1_token1_address = get_token_addresses_v2(stable_pair1_address) # USDT/ETH
-    
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        data = {'block_number': block_number}
-        
-        # Get the price of the tokens in the target pair
-        price_coin0_in_coin1 = get_v2_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token0')
-        price_coin1_in_coin0 = 1 / price_coin0_in_coin1 if price_coin0_in_coin1 else 0
-        
-        # Get the price token in term of stable coin(e.g., ETH)
-        price_stable0_token1_in_stable = get_v2_price(stable0_token0_address, stable0_token1_address, stable_pair0_address, block_number, 'token1')
-        price_stable1_token1_in_stable = get_v2_price(stable1_token0_address, stable1_token1_address, stable_pair1_address, block_number, 'token1')
-        
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = price_coin0_in_coin1
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = price_stable0_token1_in_stable
-        data['coin1_price_in_usd'] = price_stable1_token1_in_stable
-        
-        # Append the data to the DataFrame
-        df = df.append(data, ignore_index=True)
-    
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
+@timed('decode')
+def reserves_to_arrays(reserves_by_block, start_block, end_block, pair_count):
+    """
+    Copy per-block reserves into preallocated arrays so prices can be computed for the whole range at once.
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
-    
-    return df
+    Returns:
+    - tuple: (reserve0, reserve1) float64 arrays of shape (blocks, pairs), row i holding start_block + i.
+    """
+    block_count = end_block - start_block + 1
+    reserve0 = np.empty((block_count, pair_count), dtype=np.float64)
+    reserve1 = np.empty((block_count, pair_count), dtype=np.float64)
+    for row, block_number in enumerate(range(start_block, end_block + 1)):
+        for column, reserves in enumerate(reserves_by_block[block_number]):
+            reserve0[row, column] = reserves[0]
+            reserve1[row, column] = reserves[1]
+
+    return reserve0, reserve1
 
 ############################################################
-def create_price_dataframe_stable_v2(start_block, end_block, target_pair_address_stable, file_name='your_file.csv'):
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    # Get the token addresses for each pair
-    target_token0_address, target_token1_address = get_token_addresses_v2(target_pair_address_stable)
+def fetch_reserves_arrays(pair_addresses, start_block, end_block, max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    """
+    Read the reserves of several pairs for every block in a range into arrays, with the options of fetch_reserves_range.
 
-    
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        # Dictionary to hold data for this block number
-        data = {
-            'block_number': block_number,
-            'coin0_price_in_coin1': None,
-            'coin1_price_in_coin0': None,
-            'coin0_price_in_usd': None,
-            'coin1_price_in_usd': None
-        }
-        
-        # Get the price of the tokens in the target pair
-        price_coin1_in_coin0 = get_v2_price(target_token0_address, target_token1_address, target_pair_address_stable, block_number, 'token1')
-        
-        # Get the price of stablecoins in terms of the base token (e.g., ETH)
-
-        
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = 1.0
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = 1.0
-        data['coin1_price_in_usd'] = price_coin1_in_coin0
-        
-        # Append the data to the DataFrame
-        df.loc[len(df)] = data  # This line replaces df = df.append(data, ignore_index=True)
-    
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
+    Raw storage reads without a cache are decoded with integer bit operations straight into the arrays
+    (storageReader.fetch_v2_reserves_arrays); every other source goes through reserves_to_arrays.
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
-    
-    return df
+    Returns:
+    - tuple: (reserve0, reserve1) float64 arrays of shape (blocks, pairs), row i holding start_block + i.
+    """
+    if use_storage and cache is None and not use_logs and not adaptive:
+        reserves = fetch_v2_reserves_arrays(get_w3(), pair_addresses, start_block, end_block)
+        return reserves['reserve0'], reserves['reserve1']
+
+    reserves_by_block = fetch_reserves_range(pair_addresses, start_block, end_block, max_concurrency, use_logs, cache, adaptive, use_storage)
+    return reserves_to_arrays(reserves_by_block, start_block, end_block, len(pair_addresses))
 
 ############################################################
-def create_price_dataframe_ETH_DUCK_v2(start_block, end_block, target_pair_address, stable_pair0_address, file_name='your_file.csv'):
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    # Get the token addresses for each pair
-    target_token0_address, target_token1_address = get_token_addresses_v2(target_pair_address)
-    stable0_token0_address, stable0_token1_address = get_token_addresses_v2(stable_pair0_address) 
+@timed('fetch')
+def fetch_reserves_range(pair_addresses, start_block, end_block, max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    """
+    Read the reserves of several pairs for every block in a range.
 
-    
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        data = {
-            'block_number': block_number,
-            'coin0_price_in_coin1': None,
-            'coin1_price_in_coin0': None,
-            'coin0_price_in_usd': None,
-            'coin1_price_in_usd': None
-        }
-        
-        # Get the price of the tokens in the target pair
-        price_coin0_in_coin1 = get_v2_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token0')
-        price_coin1_in_coin0 = 1 / price_coin0_in_coin1 if price_coin0_in_coin1 else 0
-        
-        # Get the price token in term of stable coin(e.g., ETH)
-        price_stable0_token1_in_stable = get_v2_price(stable0_token0_address, stable0_token1_address, stable_pair0_address, block_number, 'token1')
-    
-        
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = price_coin0_in_coin1
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = price_stable0_token1_in_stable
-        data['coin1_price_in_usd'] = price_coin1_in_coin0 * price_stable0_token1_in_stable
-        
-        # Append the data to the DataFrame
-        df.loc[len(df)] = data  # This line replaces df = df.append(data, ignore_index=True)
-    
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
+    Parameters:
+    - pair_addresses (list): The contract addresses of the Uniswap V2 pairs.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - max_concurrency (int): If set, fetch blocks concurrently with at most this many requests in flight.
+    - use_logs (bool): If True, rebuild the reserves from Sync events instead of reading every block.
+    - cache (StateCache): If set, serve blocks from this on-disk cache and store the ones that had to be fetched.
+    - adaptive (bool): If True, only read the blocks needed to locate reserve changes (see fetch_reserves_range_adaptive).
+    - use_storage (bool): If True, read the packed reserve slot with batched eth_getStorageAt instead of calling getReserves().
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
-    
-    return df
+    Returns:
+    - dict: block_number -> list of (reserve0, reserve1, blockTimestampLast), one per pair.
+    """
+    if cache is not None:
+        return cached_fetch_range(
+            cache, 'v2_reserves',
+            lambda addresses, run_start, run_end: fetch_reserves_range(addresses, run_start, run_end, max_concurrency, use_logs, adaptive=adaptive, use_storage=use_storage),
+            pair_addresses, start_block, end_block)
 
-def create_price_dataframe_WBTC_ETH_v2(start_block, end_block, target_pair_address, stable_pair0_address, file_name='your_file.csv'):
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    # Get the token addresses for each pair
-    target_token0_address, target_token1_address = get_token_addresses_v2(target_pair_address)
-    stable0_token0_address, stable0_token1_address = get_token_addresses_v2(stable_pair0_address) 
+    if use_logs:
+        return fetch_reserves_range_from_logs(pair_addresses, start_block, end_block)
 
+    if adaptive:
+        return fetch_reserves_range_adaptive(pair_addresses, start_block, end_block)
+
+    if use_storage:
+        return fetch_v2_reserves_storage_range(get_w3(), pair_addresses, start_block, end_block)
+
+    if max_concurrency:
+        if get_client().scheduled:
+            return fetch_range_threaded(get_w3(), fetch_v2_reserves, pair_addresses, start_block, end_block, max_concurrency)
+        return fetch_v2_reserves_range(get_client().endpoint_uri, pair_addresses, start_block, end_block, max_concurrency)
+
+    return {block_number: fetch_v2_reserves(get_w3(), pair_addresses, block_number) for block_number in range(start_block, end_block + 1)}
+
+############################################################
+def find_reserve_changes(pair_addresses, start_block, end_block):
+    """
+    Locate the blocks where the reserves of several pairs change, by bisecting on blockTimestampLast.
+
+    getReserves() returns the timestamp of the last block that updated the reserves, so if it is the
+    same at both ends of an interval the pair did not change inside it. Only intervals whose ends differ
+    are split, and only the pairs that differ are read at the midpoint, so a pair with k changes costs
+    about k * log2(range) reads instead of one per block.
+
+    Parameters:
+    - pair_addresses (list): The contract addresses of the Uniswap V2 pairs.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+
+    Returns:
+    - dict: sampled block_number -> list of (reserve0, reserve1, blockTimestampLast), one per pair, in block
+      order. Between two consecutive sampled blocks the reserves equal those of the earlier one.
+    """
+    w3 = get_w3()
+    samples = {start_block: fetch_v2_reserves(w3, pair_addresses, start_block)}
+    if end_block > start_block:
+        samples[end_block] = fetch_v2_reserves(w3, pair_addresses, end_block)
+
+    # Intervals (left, right) still to search, with the positions of the pairs that changed inside them
+    intervals = [(start_block, end_block)]
+    while intervals:
+        left, right = intervals.pop()
+        changed = [position for position, (left_state, right_state) in enumerate(zip(samples[left], samples[right]))
+                   if left_state != right_state]
+        if not changed or right - left < 2:
+            continue
+
+        middle = (left + right) // 2
+        middle_states = list(samples[left])
+        for position, reserves in zip(changed, fetch_v2_reserves(w3, [pair_addresses[position] for position in changed], middle)):
+            middle_states[position] = reserves
+        samples[middle] = middle_states
+        intervals.extend([(middle, right), (left, middle)])
+
+    return dict(sorted(samples.items()))
+
+def fetch_reserves_range_adaptive(pair_addresses, start_block, end_block):
+    """
+    Read the reserves of several pairs for every block in a range, fetching only around reserve changes
+    (see find_reserve_changes) and filling the unchanged stretches without any call.
+
+    Returns:
+    - dict: block_number -> list of (reserve0, reserve1, blockTimestampLast), one per pair.
+    """
+    samples = find_reserve_changes(pair_addresses, start_block, end_block)
+    sampled_blocks = list(samples)
+
+    reserves_by_block = {}
+    for sampled_block, next_sampled_block in zip(sampled_blocks, sampled_blocks[1:] + [end_block + 1]):
+        for block_number in range(sampled_block, next_sampled_block):
+            reserves_by_block[block_number] = samples[sampled_block]
+
+    return reserves_by_block
+
+############################################################
+def fetch_reserves_range_from_logs(pair_addresses, start_block, end_block, chunk_size=DEFAULT_LOG_CHUNK_SIZE):
+    """
+    Rebuild the reserves of several pairs for every block in a range from their Sync events.
+
+    The reserves are read once at start_block; after that they only change when a pair emits Sync,
+    so every other block is forward-filled from the last Sync. Reserves rebuilt from a Sync event
+    carry None as blockTimestampLast, since the event does not include it.
+
+    Parameters:
+    - pair_addresses (list): The contract addresses of the Uniswap V2 pairs.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - chunk_size (int): The number of blocks per eth_getLogs call.
+
+    Returns:
+    - dict: block_number -> list of (reserve0, reserve1, blockTimestampLast), one per pair.
+    """
+    w3 = get_w3()
+    initial_reserves = fetch_v2_reserves(w3, pair_addresses, start_block)
+
+    events = []
+    for log in get_logs_chunked(w3, set(pair_addresses), SYNC_TOPIC, start_block + 1, end_block, chunk_size):
+        reserve0, reserve1 = w3.codec.decode(['uint112', 'uint112'], bytes(log['data']))
+        events.append((log['blockNumber'], log['logIndex'], log['address'], (reserve0, reserve1, None)))
+
+    return forward_fill(pair_addresses, initial_reserves, events, start_block, end_block)
+
+############################################################
+def create_price_dataframe_v2(start_block, end_block, target_pair_address, stable_pair0_address, stable_pair1_address, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    # Get the tokens and decimals of each pair
+    pair_addresses = [target_pair_address, stable_pair0_address, stable_pair1_address] # WBTC/ETH, USDC/WBTC, USDT/ETH
+    target_pool, stable0_pool, stable1_pool = registry.get_pools(pair_addresses)
     
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        data = {
-            'block_number': block_number,
-            'coin0_price_in_coin1': None,
-            'coin1_price_in_coin0': None,
-            'coin0_price_in_usd': None,
-            'coin1_price_in_usd': None
-        }
-        
-        # Get the price of the tokens in the target pair
-        price_coin0_in_coin1 = get_v2_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token0')
-        price_coin1_in_coin0 = 1 / price_coin0_in_coin1 if price_coin0_in_coin1 else 0
-        
-        # Get the price token in term of stable coin(e.g., ETH)
-        price_stable0_token1_in_stable = get_v2_price(stable0_token0_address, stable0_token1_address, stable_pair0_address, block_number, 'token1')
+    # Read the reserves of all three pairs, one round trip per block
+    reserve0, reserve1 = fetch_reserves_arrays(pair_addresses, start_block, end_block, max_concurrency, use_logs, cache, adaptive, use_storage)
+
+    # Get the price of the tokens in the target pair
+    price_coin0_in_coin1 = reserves_to_price((reserve0[:, 0], reserve1[:, 0]), target_pool['token0_decimals'], target_pool['token1_decimals'], 'token0')
+    price_coin1_in_coin0 = reciprocal(price_coin0_in_coin1)
     
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = price_coin0_in_coin1
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = price_coin0_in_coin1 * price_stable0_token1_in_stable
-        data['coin1_price_in_usd'] = price_stable0_token1_in_stable
-        
-        # Append the data to the DataFrame
-        df.loc[len(df)] = data  # This line replaces df = df.append(data, ignore_index=True)
+    # Get the price token in term of stable coin(e.g., ETH)
+    price_stable0_token1_in_stable = reserves_to_price((reserve0[:, 1], reserve1[:, 1]), stable0_pool['token0_decimals'], stable0_pool['token1_decimals'], 'token1')
+    price_stable1_token1_in_stable = reserves_to_price((reserve0[:, 2], reserve1[:, 2]), stable1_pool['token0_decimals'], stable1_pool['token1_decimals'], 'token1')
     
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
+    # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
+    # Calculate the price in USD, build the DataFrame and save it to a CSV file
+    return build_price_dataframe(start_block, end_block, {
+        'coin0_price_in_coin1': price_coin0_in_coin1,
+        'coin1_price_in_coin0': price_coin1_in_coin0,
+        'coin0_price_in_usd': price_stable0_token1_in_stable,
+        'coin1_price_in_usd': price_stable1_token1_in_stable,
+    }, file_name)
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
+############################################################
+def create_price_dataframe_stable_v2(start_block, end_block, target_pair_address_stable, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    # Get the tokens and decimals of the pair
+    target_pool = registry.get_pool(target_pair_address_stable)
+    reserve0, reserve1 = fetch_reserves_arrays([target_pair_address_stable], start_block, end_block, max_concurrency, use_logs, cache, adaptive, use_storage)
+    
+    # Get the price of the tokens in the target pair
+    price_coin1_in_coin0 = reserves_to_price((reserve0[:, 0], reserve1[:, 0]), target_pool['token0_decimals'], target_pool['token1_decimals'], 'token1')
     
-    return df
+    # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
+    # Calculate the price in USD, build the DataFrame and save it to a CSV file
+    return build_price_dataframe(start_block, end_block, {
+        'coin0_price_in_coin1': 1.0,
+        'coin1_price_in_coin0': price_coin1_in_coin0,
+        'coin0_price_in_usd': 1.0,
+        'coin1_price_in_usd': price_coin1_in_coin0,
+    }, file_name)
+
+############################################################
+# The two-pool shortcuts below price the target pool's token0/token1 (as read from the registry) along routes
+# through the stable pair; priceRouter is imported on use since it imports this module
+def create_price_dataframe_ETH_DUCK_v2(start_block, end_block, target_pair_address, stable_pair0_address, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    from priceRouter import price_pair
+    return price_pair('v2', start_block, end_block, target_pair_address, stable_pair0_address, file_name,
+                      max_concurrency=max_concurrency, use_logs=use_logs, cache=cache, adaptive=adaptive, use_storage=use_storage)
+
+def create_price_dataframe_WBTC_ETH_v2(start_block, end_block, target_pair_address, stable_pair0_address, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, adaptive=False, use_storage=False):
+    from priceRouter import price_pair
+    return price_pair('v2', start_block, end_block, target_pair_address, stable_pair0_address, file_name,
+                      max_concurrency=max_concurrency, use_logs=use_logs, cache=cache, adaptive=adaptive, use_storage=use_storage)
@@ -1,23 +1,24 @@
+import numpy as np
 import pandas as pd
-from web3 import Web3
-import json
-import os
+from multicallBatch import fetch_v3_slot0, fetch_v3_observe, fetch_v3_oldest_observation_timestamps
+from asyncBlockFetcher import fetch_v3_slot0_range, fetch_range_threaded
+from storageReader import fetch_v3_slot0_storage_range, fetch_v3_slot0_arrays
+from logBackfill import get_logs_chunked, forward_fill, DEFAULT_LOG_CHUNK_SIZE
+from stateCache import cached_fetch_range
+from tokenRegistry import PoolRegistry
+from priceFrame import build_price_dataframe
+from rpcClient import get_client, get_w3
+from blockTimestamps import find_block_at_timestamp
+from pipelineStats import timed
 
-# Load the .env file
-from dotenv import load_dotenv
-load_dotenv()
+# The Web3 connection (Infura by default, see rpcClient.configure) is only opened on first use,
+# so importing this module does no I/O
 
-# Access the INFURA_API_KEY environment variable
-INFURA_API_KEY = os.getenv('INFURA_API_KEY')
-w3 = Web3(Web3.HTTPProvider(f'https://mainnet.infura.io/v3/{INFURA_API_KEY}'))
+# Token addresses and decimals of every pool seen so far, persisted between runs
+registry = PoolRegistry()
 
-# Load Uniswap V3 Pool ABI
-with open('abiContracts/erc20_abi.json', 'r') as f:
-    erc20_abi = json.load(f)
-
-# Load Uniswap V3 Pool ABI
-with open('abiContracts/uniswap_v3_pool_abi.json', 'r') as f:
-    uniswap_v3_pool_abi = json.load(f)
+# Uniswap V3 Pool ABI
+UNISWAP_V3_POOL_ABI = 'uniswap_v3_pool_abi.json'
 
 #####################################################
 start_block = 12345678 
@@ -27,26 +28,31 @@ stable_pair0_address = 0x3fA010dD043a2B6673ce017480674E2D77239267 # USDC/HAY
 stable_pair1_address = 0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640 # USDC/ETH
 target_pair_address_stable = 0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640 # USDC/ETH
 
+# keccak256('Swap(address,address,int256,int256,uint160,uint128,int24)'), emitted by a pool on every swap
+SWAP_TOPIC = '0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67'
+
+# secondsAgos per observe() call; each costs a binary search over the oracle, so huge arrays could hit the eth_call gas cap
+ORACLE_POINTS_PER_CALL = 500
+
 #####################################################
 def get_decimals(token_address):
-    token_contract = w3.eth.contract(address=token_address, abi=erc20_abi)
-    return token_contract.functions.decimals().call()
+    return registry.get_token_decimals([token_address])[0]
 
 ################################################
 # Assuming get_token_addresses is a function that returns the addresses of token0 and token1 of a pair
 def get_token_addresses_v3(pair_address):
-    # Create a contract instance
-    pair_contract = w3.eth.contract(address=pair_address, abi=uniswap_v3_pool_abi)
-
-    # Call the token0 and token1 functions
-    token0_address = pair_contract.functions.token0().call()
-    token1_address = pair_contract.functions.token1().call()
+    # token0/token1 never change, so they are resolved once and kept in the registry
+    pool = registry.get_pool(pair_address)
+    return pool['token0'], pool['token1']
 
-    return token0_address, token1_address
+################################################
+def get_pool_contract(pool_address):
+    # Contract objects are built once per connection by the client
+    return get_client().contract(pool_address, UNISWAP_V3_POOL_ABI)
 
 ################################################
 def get_tick(pool_address, block_number):
-    pool_contract = w3.eth.contract(address=pool_address, abi=uniswap_v3_pool_abi)
+    pool_contract = get_pool_contract(pool_address)
     slot0_data = pool_contract.functions.slot0().call(block_identifier=block_number)
     return slot0_data[1]  # Assuming the tick is the second element in the slot0 data tuple
 
@@ -66,15 +72,11 @@ def get_v3_price__(token0_address, token1_address, pool_address, block_number, t
     Returns:
     - float: The price of the specified token.
     """
-    # Create contract instances
-    token0_contract = w3.eth.contract(address=token0_address, abi=erc20_abi)
-    token1_contract = w3.eth.contract(address=token1_address, abi=erc20_abi)
-    
     # Get token decimals
     token0_decimals = get_decimals(token0_address)
     token1_decimals = get_decimals(token1_address)
     
-    pool_contract = w3.eth.contract(address=pool_address, abi=uniswap_v3_pool_abi)
+    pool_contract = get_pool_contract(pool_address)
     slot0_data = pool_contract.functions.slot0().call(block_identifier=block_number)
     sqrt_price_x96 = slot0_data[0]
 
@@ -90,55 +92,248 @@ def get_v3_price__(token0_address, token1_address, pool_address, block_number, t
         raise ValueError("Invalid token_to_price argument. Must be 'token0' or 'token1'.")
 
 
+################################################
+@timed('decode')
+def ticks_to_array(slot0_by_block, start_block, end_block, pool_count):
+    """
+    Copy per-block ticks into a preallocated array so prices can be computed for the whole range at once.
+
+    Returns:
+    - ndarray: int64 array of shape (blocks, pools), row i holding start_block + i.
+    """
+    ticks = np.empty((end_block - start_block + 1, pool_count), dtype=np.int64)
+    for row, block_number in enumerate(range(start_block, end_block + 1)):
+        for column, slot0 in enumerate(slot0_by_block[block_number]):
+            ticks[row, column] = slot0[1]
+
+    return ticks
+
+################################################
+def fetch_ticks_array(pool_addresses, start_block, end_block, max_concurrency=None, use_logs=False, cache=None, use_storage=False):
+    """
+    Read the tick of several pools for every block in a range into an array, with the options of fetch_slot0_range.
+
+    Raw storage reads without a cache are decoded with integer bit operations straight into the array
+    (storageReader.fetch_v3_slot0_arrays); every other source goes through ticks_to_array.
+
+    Returns:
+    - ndarray: Integer array of shape (blocks, pools), row i holding start_block + i.
+    """
+    if use_storage and cache is None and not use_logs:
+        return fetch_v3_slot0_arrays(get_w3(), pool_addresses, start_block, end_block)['tick']
+
+    slot0_by_block = fetch_slot0_range(pool_addresses, start_block, end_block, max_concurrency, use_logs, cache, use_storage)
+    return ticks_to_array(slot0_by_block, start_block, end_block, len(pool_addresses))
+
+################################################
+@timed('fetch')
+def fetch_slot0_range(pool_addresses, start_block, end_block, max_concurrency=None, use_logs=False, cache=None, use_storage=False):
+    """
+    Read slot0 of several pools for every block in a range.
+
+    Parameters:
+    - pool_addresses (list): The contract addresses of the Uniswap V3 pools.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - max_concurrency (int): If set, fetch blocks concurrently with at most this many requests in flight.
+    - use_logs (bool): If True, rebuild slot0 from Swap events instead of reading every block.
+    - cache (StateCache): If set, serve blocks from this on-disk cache and store the ones that had to be fetched.
+    - use_storage (bool): If True, read the packed slot0 slot with batched eth_getStorageAt instead of calling slot0().
+
+    Returns:
+    - dict: block_number -> list of decoded slot0 tuples, one per pool.
+    """
+    if cache is not None:
+        return cached_fetch_range(
+            cache, 'v3_slot0',
+            lambda addresses, run_start, run_end: fetch_slot0_range(addresses, run_start, run_end, max_concurrency, use_logs, use_storage=use_storage),
+            pool_addresses, start_block, end_block)
+
+    if use_logs:
+        return fetch_slot0_range_from_logs(pool_addresses, start_block, end_block)
+
+    if use_storage:
+        return fetch_v3_slot0_storage_range(get_w3(), pool_addresses, start_block, end_block)
+
+    if max_concurrency:
+        if get_client().scheduled:
+            return fetch_range_threaded(get_w3(), fetch_v3_slot0, pool_addresses, start_block, end_block, max_concurrency)
+        return fetch_v3_slot0_range(get_client().endpoint_uri, pool_addresses, start_block, end_block, max_concurrency)
+
+    return {block_number: fetch_v3_slot0(get_w3(), pool_addresses, block_number) for block_number in range(start_block, end_block + 1)}
+
+################################################
+def fetch_slot0_range_from_logs(pool_addresses, start_block, end_block, chunk_size=DEFAULT_LOG_CHUNK_SIZE):
+    """
+    Rebuild slot0 of several pools for every block in a range from their Swap events.
+
+    slot0 is read once at start_block; after that the price only moves on a swap, and every Swap event
+    carries the new sqrtPriceX96 and tick, so the other blocks are forward-filled from the last Swap.
+    Only sqrtPriceX96 and tick are known for states rebuilt from an event; the other slot0 fields are None.
+
+    Parameters:
+    - pool_addresses (list): The contract addresses of the Uniswap V3 pools.
+    - start_block (int): The first block number.
+    - end_block (int): The last block number (inclusive).
+    - chunk_size (int): The number of blocks per eth_getLogs call.
+
+    Returns:
+    - dict: block_number -> list of slot0 tuples, one per pool.
+    """
+    w3 = get_w3()
+    initial_slot0 = fetch_v3_slot0(w3, pool_addresses, start_block)
+
+    events = []
+    for log in get_logs_chunked(w3, set(pool_addresses), SWAP_TOPIC, start_block + 1, end_block, chunk_size):
+        # Non-indexed Swap fields: amount0, amount1, sqrtPriceX96, liquidity, tick
+        _, _, sqrt_price_x96, _, tick = w3.codec.decode(['int256', 'int256', 'uint160', 'uint128', 'int24'], bytes(log['data']))
+        events.append((log['blockNumber'], log['logIndex'], log['address'], (sqrt_price_x96, tick) + (None,) * 5))
+
+    return forward_fill(pool_addresses, initial_slot0, events, start_block, end_block)
+
 ###############################################
-def create_price_dataframe_v3(start_block, end_block, target_pair_address, stable_pair0_address, stable_pair1_address, file_name='your_file.csv'):
-    # Token addresses need to be known or retrieved
-    # Assuming you have functions to get the addresses based on pair addresses
-    target_token0_address, target_token1_address = get_token_addresses_v3(target_pair_address)
-    stable0_token0_address, stable0_token1_address = get_token_addresses_v3(stable_pair0_address)
-    stable1_token0_address, stable1_token1_address = get_token_addresses_v3(stable_pair1_address)
-
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        data = {
-            'block_number': block_number,
-            'coin0_price_in_coin1': None,
-            'coin1_price_in_coin0': None,
-            'coin0_price_in_usd': None,
-            'coin1_price_in_usd': None
-        }
-        
-        # Get the price of the tokens in the target pair
-        price_coin0_in_coin1 = get_v3_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token0')
-        price_coin1_in_coin0 = get_v3_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token1')
-        
-        # Get the price of stablecoins in terms of the base token (e.g., ETH)
-        price_stable0_token1_in_stable = get_v3_price(stable0_token0_address, stable0_token1_address, stable_pair0_address, block_number, 'token1')
-        price_stable1_token1_in_stable = get_v3_price(stable1_token0_address, stable1_token1_address, stable_pair1_address, block_number, 'token1')
-        
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = price_coin0_in_coin1
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = price_stable0_token1_in_stable
-        data['coin1_price_in_usd'] = price_stable1_token1_in_stable
-        
-    
-        # Append the data to the DataFrame
-        df.loc[len(df)] = data  # This line replaces df = df.append(data, ignore_index=True)
-    
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
+def fetch_oracle_ticks(pool_addresses, timestamps, window=1, block_number=None):
+    """
+    Read the average tick of several pools over [t - window, t] for many timestamps t, from the pools'
+    own oracle (observe() tickCumulatives) at a single recent block.
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
-    
+    All the points come from one eth_call, and no archive state is needed. With window=1 the result is
+    the tick in effect at each timestamp; larger windows give time-weighted averages (TWAP ticks).
+
+    Parameters:
+    - pool_addresses (list): The contract addresses of the Uniswap V3 pools.
+    - timestamps (list): Unix timestamps, at or before the block.
+    - window (int): The averaging window in seconds.
+    - block_number (int): The block to observe from (the latest block by default).
+
+    Returns:
+    - dict: pool_address -> float64 array with one average tick per timestamp, NaN where the oracle
+      ring buffer does not reach back far enough.
+    """
+    w3 = get_w3()
+    block = w3.eth.get_block('latest' if block_number is None else block_number)
+    block_timestamp = block['timestamp']
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) and timestamps.max() > block_timestamp:
+        raise ValueError(f"Timestamps must not be after the observed block ({block_timestamp}).")
+
+    oldest_timestamps = fetch_v3_oldest_observation_timestamps(w3, pool_addresses, block['number'])
+
+    # One observe() per pool and chunk of secondsAgos, all sent in a single Multicall3 request
+    calls, plans = [], []
+    for pool_address, oldest_timestamp in zip(pool_addresses, oldest_timestamps):
+        covered = np.flatnonzero(timestamps - window >= oldest_timestamp)
+        seconds_agos = np.unique(np.concatenate([block_timestamp - timestamps[covered], block_timestamp - timestamps[covered] + window]))
+        chunks = [seconds_agos[index:index + ORACLE_POINTS_PER_CALL] for index in range(0, len(seconds_agos), ORACLE_POINTS_PER_CALL)]
+        plans.append((pool_address, covered, seconds_agos, len(calls), len(chunks)))
+        calls.extend((pool_address, [int(seconds_ago) for seconds_ago in chunk]) for chunk in chunks)
+
+    results = fetch_v3_observe(w3, calls, block['number'])
+
+    ticks = {}
+    for pool_address, covered, seconds_agos, first_call, chunk_count in plans:
+        average_ticks = np.full(len(timestamps), np.nan)
+        chunk_results = results[first_call:first_call + chunk_count]
+        if len(covered) and all(result is not None for result in chunk_results):
+            cumulatives = np.array([value for result in chunk_results for value in result], dtype=np.float64)
+            end_positions = np.searchsorted(seconds_agos, block_timestamp - timestamps[covered])
+            start_positions = np.searchsorted(seconds_agos, block_timestamp - timestamps[covered] + window)
+            average_ticks[covered] = (cumulatives[end_positions] - cumulatives[start_positions]) / window
+        ticks[pool_address] = average_ticks
+
+    return ticks
+
+def get_oracle_ticks(pool_addresses, timestamps, window=1, block_number=None):
+    """
+    Same as fetch_oracle_ticks, falling back to slot0 (the spot tick at the last block at or before the
+    timestamp, read from an archive node) for the timestamps older than a pool's oracle.
+
+    The fallback ticks are spot ticks, not averages over the window (see create_price_dataframe_oracle_v3's
+    price_source column to tell them apart).
+
+    Returns:
+    - dict: pool_address -> float64 array with one tick per timestamp.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    return fill_ticks_from_slot0(fetch_oracle_ticks(pool_addresses, timestamps, window, block_number), timestamps)
+
+def fill_ticks_from_slot0(ticks, timestamps):
+    """
+    Replace the NaN ticks of fetch_oracle_ticks, in place, by the slot0 tick at the last block at or before their timestamp.
+    """
+    missing = {}
+    for pool_address, pool_ticks in ticks.items():
+        for position in np.flatnonzero(np.isnan(pool_ticks)):
+            missing.setdefault(int(timestamps[position]), []).append((pool_address, position))
+
+    w3 = get_w3()
+    for timestamp, pools in sorted(missing.items()):
+        block_at_timestamp = find_block_at_timestamp(timestamp)
+        slot0s = fetch_v3_slot0(w3, [pool_address for pool_address, _ in pools], block_at_timestamp)
+        for (pool_address, position), slot0 in zip(pools, slot0s):
+            ticks[pool_address][position] = slot0[1]
+
+    return ticks
+
+def create_price_dataframe_oracle_v3(start_time, end_time, interval, target_pair_address, window=None, file_name=None, block_number=None):
+    """
+    Price a pool at regular time intervals from its oracle, in one request instead of one archive read per block.
+
+    Parameters:
+    - start_time (int): The first unix timestamp.
+    - end_time (int): The last unix timestamp (inclusive).
+    - interval (int): Seconds between two samples.
+    - target_pair_address (str): The contract address of the Uniswap V3 pool.
+    - window (int): The TWAP window in seconds; the interval by default, 1 for spot prices.
+    - file_name (str): If set, the DataFrame is also saved to this CSV file.
+    - block_number (int): The block to observe from (the latest block by default).
+
+    Returns:
+    - DataFrame: coin0_price_in_coin1 and coin1_price_in_coin0 indexed by timestamp, and price_source:
+      'oracle' for rows averaged over the window, 'slot0' for rows older than the oracle, which are spot prices
+      read from an archive node.
+    """
+    target_pool = registry.get_pool(target_pair_address)
+    timestamps = np.arange(start_time, end_time + 1, interval, dtype=np.int64)
+    ticks = fetch_oracle_ticks([target_pair_address], timestamps, window or interval, block_number)
+    price_source = np.where(np.isnan(ticks[target_pair_address]), 'slot0', 'oracle')
+    ticks = fill_ticks_from_slot0(ticks, timestamps)[target_pair_address]
+
+    df = pd.DataFrame({
+        'coin0_price_in_coin1': tick_to_price(ticks, target_pool['token0_decimals'], target_pool['token1_decimals'], 'token0'),
+        'coin1_price_in_coin0': tick_to_price(ticks, target_pool['token0_decimals'], target_pool['token1_decimals'], 'token1'),
+        'price_source': price_source,
+    }, index=pd.Index(timestamps, name='timestamp'))
+    if file_name:
+        df.to_csv(file_name)
     return df
 
+###############################################
+def create_price_dataframe_v3(start_block, end_block, target_pair_address, stable_pair0_address, stable_pair1_address, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, use_storage=False):
+    # Token addresses and decimals come from the registry
+    pool_addresses = [target_pair_address, stable_pair0_address, stable_pair1_address]
+    target_pool, stable0_pool, stable1_pool = registry.get_pools(pool_addresses)
+
+    # Read slot0 of all pools, one round trip per block
+    ticks = fetch_ticks_array(pool_addresses, start_block, end_block, max_concurrency, use_logs, cache, use_storage)
+
+    # Get the price of the tokens in the target pair
+    price_coin0_in_coin1 = tick_to_price(ticks[:, 0], target_pool['token0_decimals'], target_pool['token1_decimals'], 'token0')
+    price_coin1_in_coin0 = tick_to_price(ticks[:, 0], target_pool['token0_decimals'], target_pool['token1_decimals'], 'token1')
+    
+    # Get the price of stablecoins in terms of the base token (e.g., ETH)
+    price_stable0_token1_in_stable = tick_to_price(ticks[:, 1], stable0_pool['token0_decimals'], stable0_pool['token1_decimals'], 'token1')
+    price_stable1_token1_in_stable = tick_to_price(ticks[:, 2], stable1_pool['token0_decimals'], stable1_pool['token1_decimals'], 'token1')
+    
+    # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
+    # Calculate the price in USD, build the DataFrame and save it to a CSV file
+    return build_price_dataframe(start_block, end_block, {
+        'coin0_price_in_coin1': price_coin0_in_coin1,
+        'coin1_price_in_coin0': price_coin1_in_coin0,
+        'coin0_price_in_usd': price_stable0_token1_in_stable,
+        'coin1_price_in_usd': price_stable1_token1_in_stable,
+    }, file_name)
+
 #################################################################
 
 def get_v3_price(token0_address, token1_address, pool_address, block_number, token_to_price):
@@ -164,6 +359,23 @@ def get_v3_price(token0_address, token1_address, pool_address, block_number, tok
     token1_decimals = get_decimals(token1_address)
     
     tick = get_tick(pool_address, block_number)
+    return tick_to_price(tick, token0_decimals, token1_decimals, token_to_price)
+
+#################################################################
+@timed('compute')
+def tick_to_price(tick, token0_decimals, token1_decimals, token_to_price):
+    """
+    Convert a Uniswap V3 pool tick into the price of one token of the pool.
+
+    Parameters:
+    - tick (int or ndarray): The current tick of the pool (slot0().tick), or an array of ticks to price many blocks at once.
+    - token0_decimals (int): The decimals of token0.
+    - token1_decimals (int): The decimals of token1.
+    - token_to_price (str): Specify which token's price to get ('token0' or 'token1').
+
+    Returns:
+    - float or ndarray: The price of the specified token.
+    """
     price_token1_in_token0_raw = 1.0001 ** tick
     price_token0_in_token1_raw = 1 / price_token1_in_token0_raw
     
@@ -178,93 +390,29 @@ def get_v3_price(token0_address, token1_address, pool_address, block_number, tok
 
 
 ###############################################
-def create_price_dataframe_stable_v3(start_block, end_block, target_pair_address_stable, file_name='your_file.csv'):
-    # Token addresses need to be known or retrieved
-    # Assuming you have functions to get the addresses based on pair addresses
-    target_token0_address, target_token1_address = get_token_addresses_v3(target_pair_address_stable)
-
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        data = {
-            'block_number': block_number,
-            'coin0_price_in_coin1': None,
-            'coin1_price_in_coin0': None,
-            'coin0_price_in_usd': None,
-            'coin1_price_in_usd': None
-        }
-        
-        # Get the price of the tokens in the target pair
-        price_coin1_in_coin0 = get_v3_price(target_token0_address, target_token1_address, target_pair_address_stable, block_number, 'token1')
-        price_coin0_in_coin1 = get_v3_price(target_token0_address, target_token1_address, target_pair_address_stable, block_number, 'token0')
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = price_coin0_in_coin1
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = price_coin0_in_coin1
-        data['coin1_price_in_usd'] = price_coin1_in_coin0
-        
-        # Append the data to the DataFrame
-        df.loc[len(df)] = data  # This line replaces df = df.append(data, ignore_index=True)
-    
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
+def create_price_dataframe_stable_v3(start_block, end_block, target_pair_address_stable, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, use_storage=False):
+    # Token addresses and decimals come from the registry
+    target_pool = registry.get_pool(target_pair_address_stable)
+    ticks = fetch_ticks_array([target_pair_address_stable], start_block, end_block, max_concurrency, use_logs, cache, use_storage)
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
-    
-    return df
+    # Get the price of the tokens in the target pair
+    price_coin1_in_coin0 = tick_to_price(ticks[:, 0], target_pool['token0_decimals'], target_pool['token1_decimals'], 'token1')
+    price_coin0_in_coin1 = tick_to_price(ticks[:, 0], target_pool['token0_decimals'], target_pool['token1_decimals'], 'token0')
+
+    # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
+    # Calculate the price in USD, build the DataFrame and save it to a CSV file
+    return build_price_dataframe(start_block, end_block, {
+        'coin0_price_in_coin1': price_coin0_in_coin1,
+        'coin1_price_in_coin0': price_coin1_in_coin0,
+        'coin0_price_in_usd': price_coin0_in_coin1,
+        'coin1_price_in_usd': price_coin1_in_coin0,
+    }, file_name)
 
 ##################################################################
 ###############################################
-def create_price_dataframe_NATI_ETH_v3(start_block, end_block, target_pair_address, stable_pair1_address, file_name='your_file.csv'):
-    # Token addresses need to be known or retrieved
-    # Assuming you have functions to get the addresses based on pair addresses
-    target_token0_address, target_token1_address = get_token_addresses_v3(target_pair_address)
-    #stable0_token0_address, stable0_token1_address = get_token_addresses_v3(stable_pair0_address)
-    stable1_token0_address, stable1_token1_address = get_token_addresses_v3(stable_pair1_address)
-
-    # Initialize an empty DataFrame
-    columns = ['block_number', 'coin0_price_in_coin1', 'coin1_price_in_coin0', 'coin0_price_in_usd', 'coin1_price_in_usd']
-    df = pd.DataFrame(columns=columns)
-    
-    for block_number in range(start_block, end_block + 1):
-        # Dictionary to hold data for this block number
-        data = {
-            'block_number': block_number,
-            'coin0_price_in_coin1': None,
-            'coin1_price_in_coin0': None,
-            'coin0_price_in_usd': None,
-            'coin1_price_in_usd': None
-        }
-        
-        # Get the price of the tokens in the target pair
-        price_coin0_in_coin1 = get_v3_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token1')
-        price_coin1_in_coin0 = get_v3_price(target_token0_address, target_token1_address, target_pair_address, block_number, 'token0')
-        
-        # Get the price of stablecoins in terms of the base token (e.g., ETH)
-        #price_stable0_token1_in_stable = get_v3_price(stable0_token0_address, stable0_token1_address, stable_pair0_address, block_number, 'token1')
-        price_stable1_token1_in_stable = get_v3_price(stable1_token0_address, stable1_token1_address, stable_pair1_address, block_number, 'token0')
-        
-        # Assuming the base token in both stablecoin pairs is the same (e.g., ETH)
-        # Calculate and store the price in USD
-        data['coin0_price_in_coin1'] = price_coin0_in_coin1
-        data['coin1_price_in_coin0'] = price_coin1_in_coin0
-        data['coin0_price_in_usd'] = price_coin0_in_coin1 * price_stable1_token1_in_stable
-        data['coin1_price_in_usd'] = price_stable1_token1_in_stable
-        
-    
-        # Append the data to the DataFrame
-        df.loc[len(df)] = data  # This line replaces df = df.append(data, ignore_index=True)
-    
-    # Set the block_number column as the index of the DataFrame
-    df.set_index('block_number', inplace=True)
-
-    # Save the DataFrame to a CSV file
-    df.to_csv(file_name, index=True)
-    
-    return df
-
+# Prices the target pool's token0/token1 (as read from the registry) along routes through the stable pool;
+# priceRouter is imported on use since it imports this module
+def create_price_dataframe_NATI_ETH_v3(start_block, end_block, target_pair_address, stable_pair1_address, file_name='your_file.csv', max_concurrency=None, use_logs=False, cache=None, use_storage=False):
+    from priceRouter import price_pair
+    return price_pair('v3', start_block, end_block, target_pair_address, stable_pair1_address, file_name,
+                      max_concurrency=max_concurrency, use_logs=use_logs, cache=cache, use_storage=use_storage)
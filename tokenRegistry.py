@@ -0,0 +1,105 @@
+import json
+import os
+
+from multicallBatch import fetch_token_addresses, fetch_decimals
+from pipelineStats import stats
+from rpcClient import get_w3
+
+# Default location of the on-disk token/pool metadata registry
+DEFAULT_REGISTRY_PATH = 'poolRegistry.json'
+
+#####################################################
+class PoolRegistry:
+    """
+    Token metadata and pool topology, resolved once per pool and persisted to disk.
+
+    For each pool it knows token0/token1, their decimals and the precomputed 10 ** decimals scale factors.
+    Token addresses and decimals never change, so after the first resolution no RPC call is needed.
+    """
+
+    def __init__(self, w3=None, path=DEFAULT_REGISTRY_PATH):
+        self._w3 = w3
+        self.path = path
+        self.pools = None
+        self.decimals = None
+
+    @property
+    def w3(self):
+        # Without an explicit connection, use the default client's (opened lazily, rebuilt after fork)
+        return self._w3 if self._w3 is not None else get_w3()
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}, {}
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        return {pool: tuple(tokens) for pool, tokens in data.get('pools', {}).items()}, data.get('decimals', {})
+
+    def _load(self):
+        if self.pools is None:
+            self.pools, self.decimals = self._read()
+
+    def save(self):
+        """
+        Merge the in-memory entries into the file and replace it atomically, so registries of other
+        modules or processes sharing the file keep the pools they added in the meantime.
+        """
+        if not self.path or self.pools is None:
+            return
+        pools, decimals = self._read()
+        self.pools = {**pools, **self.pools}
+        self.decimals = {**decimals, **self.decimals}
+        temporary_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump({'pools': {pool: list(tokens) for pool, tokens in self.pools.items()}, 'decimals': self.decimals}, f, indent=1)
+        os.replace(temporary_path, self.path)
+
+    def get_token_decimals(self, token_addresses):
+        """
+        Return the decimals of several tokens, reading the unknown ones in a single batched call.
+        """
+        self._load()
+        unknown = sorted({token.lower(): token for token in token_addresses if token.lower() not in self.decimals}.values())
+        stats.record_cache('token_decimals', len(token_addresses) - len(unknown), len(unknown))
+        if unknown:
+            for token, decimals in zip(unknown, fetch_decimals(self.w3, unknown)):
+                self.decimals[token.lower()] = decimals
+            self.save()
+        return [self.decimals[token.lower()] for token in token_addresses]
+
+    def get_pools(self, pool_addresses):
+        """
+        Return the metadata of several pools, resolving the unknown ones in at most two batched calls.
+
+        Parameters:
+        - pool_addresses (list): The contract addresses of Uniswap V2 pairs or V3 pools.
+
+        Returns:
+        - list: One dict per pool with keys token0, token1, token0_decimals, token1_decimals,
+          token0_scale and token1_scale (10 ** decimals).
+        """
+        self._load()
+        unknown = sorted({pool.lower(): pool for pool in pool_addresses if pool.lower() not in self.pools}.values())
+        stats.record_cache('pool_registry', len(pool_addresses) - len(unknown), len(unknown))
+        if unknown:
+            for pool, tokens in zip(unknown, fetch_token_addresses(self.w3, unknown)):
+                self.pools[pool.lower()] = tokens
+            self.save()
+
+        tokens = [self.pools[pool.lower()] for pool in pool_addresses]
+        decimals = self.get_token_decimals([token for pair in tokens for token in pair])
+
+        pools = []
+        for (token0, token1), token0_decimals, token1_decimals in zip(tokens, decimals[0::2], decimals[1::2]):
+            pools.append({
+                'token0': token0,
+                'token1': token1,
+                'token0_decimals': token0_decimals,
+                'token1_decimals': token1_decimals,
+                'token0_scale': 10 ** token0_decimals,
+                'token1_scale': 10 ** token1_decimals,
+            })
+        return pools
+
+    def get_pool(self, pool_address):
+        return self.get_pools([pool_address])[0]